@@ -6,8 +6,10 @@
 
 import addonHandler
 import api
+import array
 import bisect
 import collections
+from concurrent.futures import ThreadPoolExecutor
 import config
 import controlTypes
 from controlTypes import OutputReason, Role, State
@@ -15,14 +17,17 @@ import copy
 import core
 import ctypes
 from ctypes import create_string_buffer, byref
+import enum
 import globalPluginHandler
 import globalVars
 import gui
+import gzip
 from gui import guiHelper, nvdaControls
 from gui.settingsDialogs import SettingsPanel
 import itertools
 import json
 from logHandler import log
+import math
 import NVDAHelper
 from NVDAObjects.window import winword
 import nvwave
@@ -34,26 +39,268 @@ from scriptHandler import script, willSayAllResume
 import speech
 import speech.commands
 from speech.speech import SpeakTextInfoState
-import sre_constants
+try:
+    # Python 3.11 deprecates the public names of the regex parser modules.
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
 import struct
+import sys
 import textInfos
 import threading
 from threading import Thread
 import time
 import tones
+import types
 import ui
+import warnings
 import wave
+import weakref
 import wx
+import zlib
+try:
+    # audioop is deprecated since Python 3.11 and removed in 3.13, sample helpers below fall back to array math.
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop
+except ImportError:
+    audioop = None
+
+moduleStartTime = time.perf_counter()
+# (phase, seconds) of work done while loading the add-on, and of work deferred to first use.
+startupTimings = []
+def recordStartup(phase, startTime):
+    startupTimings.append((phase, time.perf_counter() - startTime))
+
+TRACE_OFF = 0
+TRACE_INFO = 1
+TRACE_DEBUG = 2
+traceLevelNames = {
+    TRACE_INFO: "INFO",
+    TRACE_DEBUG: "DEBUG",
+}
+# Hot paths should check this global before building trace arguments:
+#     if traceLevel >= TRACE_DEBUG:
+#         trace(TRACE_DEBUG, "%s", prettyFields(fields))
+traceLevel = TRACE_OFF
+
+class TraceRingBuffer:
+    """
+    Bounded in-memory buffer of binary trace records.
+    Each record is a header (monotonic timestamp, level, payload length) followed by UTF-8 payload.
+    When the buffer is full the oldest records are overwritten.
+    """
+    header = struct.Struct("<dBI")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buf = bytearray(capacity)
+        self.start = 0
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def _read(self, pos, n):
+        pos %= self.capacity
+        end = pos + n
+        if end <= self.capacity:
+            return bytes(self.buf[pos:end])
+        return bytes(self.buf[pos:]) + bytes(self.buf[:end - self.capacity])
+
+    def _write(self, pos, data):
+        pos %= self.capacity
+        end = pos + len(data)
+        if end <= self.capacity:
+            self.buf[pos:end] = data
+        else:
+            split = self.capacity - pos
+            self.buf[pos:] = data[:split]
+            self.buf[:end - self.capacity] = data[split:]
+
+    def _recordSize(self, pos):
+        timestamp, level, length = self.header.unpack(self._read(pos, self.header.size))
+        return self.header.size + length
+
+    def append(self, level, message):
+        payload = message.encode("utf-8", errors="replace")
+        maxPayload = self.capacity - self.header.size
+        if len(payload) > maxPayload:
+            payload = payload[:maxPayload]
+        record = self.header.pack(time.monotonic(), level, len(payload)) + payload
+        with self.lock:
+            while self.capacity - self.used < len(record):
+                size = self._recordSize(self.start)
+                self.start = (self.start + size) % self.capacity
+                self.used -= size
+            self._write(self.start + self.used, record)
+            self.used += len(record)
+
+    def records(self):
+        with self.lock:
+            pos = self.start
+            remaining = self.used
+            result = []
+            while remaining > 0:
+                timestamp, level, length = self.header.unpack(self._read(pos, self.header.size))
+                payload = self._read(pos + self.header.size, length)
+                result.append((timestamp, level, payload.decode("utf-8", errors="replace")))
+                size = self.header.size + length
+                pos += size
+                remaining -= size
+            return result
+
+    def clear(self):
+        with self.lock:
+            self.start = 0
+            self.used = 0
+
+traceBuffer = None
+def setTraceLevel(level, bufferSize=1024 * 1024):
+    global traceLevel, traceBuffer
+    if level > TRACE_OFF and (traceBuffer is None or traceBuffer.capacity != bufferSize):
+        traceBuffer = TraceRingBuffer(bufferSize)
+    traceLevel = level
+
+def trace(level, message, *args):
+    # Arguments are only formatted when tracing at this level is enabled.
+    if level > traceLevel:
+        return
+    if args:
+        message = message % args
+    traceBuffer.append(level, message)
+
+def dumpTrace(fileName):
+    if traceBuffer is None:
+        return 0
+    records = traceBuffer.records()
+    with open(fileName, "w", encoding="utf-8") as f:
+        for timestamp, level, message in records:
+            print(f"{timestamp:.6f} {traceLevelNames.get(level, level)} {message}", file=f)
+    return len(records)
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram of durations.
+    Bucket bounds are in microseconds and grow geometrically by about 19%,
+    so percentiles are reported with that precision.
+    Durations are recorded from the speech thread, pool workers and rule build threads,
+    so all access goes through lock.
+    """
+    bounds = tuple(sorted(set(int(round(2 ** (i / 4))) for i in range(4 * 27))))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.count = 0
+            self.total = 0
+            self.max = 0
+
+    def record(self, seconds):
+        micros = int(seconds * 1000000)
+        bucket = bisect.bisect_left(self.bounds, micros)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += micros
+            if micros > self.max:
+                self.max = micros
+
+    def percentile(self, p):
+        with self.lock:
+            return self.lockedPercentile(p)
+
+    def lockedPercentile(self, p):
+        # Returns upper bound of the bucket containing p-th percentile in milliseconds.
+        if self.count == 0:
+            return None
+        threshold = self.count * p / 100
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            cumulative += n
+            if cumulative >= threshold and n > 0:
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(upper, self.max) / 1000
+        return self.max / 1000
+
+    def asDict(self):
+        with self.lock:
+            return {
+                "count": self.count,
+                "meanMs": self.total / self.count / 1000 if self.count > 0 else None,
+                "maxMs": self.max / 1000,
+                "p50Ms": self.lockedPercentile(50),
+                "p95Ms": self.lockedPercentile(95),
+                "p99Ms": self.lockedPercentile(99),
+            }
+
+latencyStages = [
+    "getTextWithFields",
+    "fieldAnalysis",
+    "splitFields",
+    "originalGetTextInfoSpeech",
+    "ruleMatching",
+    "wavDecode",
+    "chainScheduling",
+    "timeToFirstSample",
+]
+latencyStats = {stage: LatencyHistogram() for stage in latencyStages}
+
+def recordLatency(stage, startTime):
+    latencyStats[stage].record(time.perf_counter() - startTime)
+
+def timeGenerator(stage, generator):
+    # Records time spent inside generator, excluding time spent by the consumer.
+    elapsed = 0
+    try:
+        while True:
+            startTime = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration as e:
+                elapsed += time.perf_counter() - startTime
+                return e.value
+            elapsed += time.perf_counter() - startTime
+            yield item
+    finally:
+        latencyStats[stage].record(elapsed)
 
-debug = True
-if debug:
-    f = open("C:\\Users\\tony\\Dropbox\\1.txt", "w", encoding="utf-8")
-    LOG_MUTEX = threading.Lock()
-def mylog(s):
-    if debug:
-        with LOG_MUTEX:
-            print(str(s), file=f)
-            f.flush()
+def formatLatencyReport():
+    lines = []
+    if startupTimings:
+        lines.append("Startup and first use:")
+        for phase, seconds in startupTimings:
+            lines.append(f"    {phase}: {seconds * 1000:.3f}ms")
+    for stage in latencyStages:
+        stats = latencyStats[stage].asDict()
+        if stats["count"] == 0:
+            lines.append(f"{stage}: no data")
+            continue
+        lines.append(
+            f"{stage}: n={stats['count']} "
+            f"p50={stats['p50Ms']:.3f}ms p95={stats['p95Ms']:.3f}ms p99={stats['p99Ms']:.3f}ms "
+            f"max={stats['maxMs']:.3f}ms"
+        )
+    lines.append(
+        f"Earcons: superseded={earconThrottle.superseded} "
+        f"dropped={earconThrottle.dropped} shortened={earconThrottle.shortened}"
+    )
+    return "\n".join(lines)
+
+def exportLatencyStats(fileName):
+    result = {stage: latencyStats[stage].asDict() for stage in latencyStages}
+    result["startupMs"] = [[phase, seconds * 1000] for phase, seconds in startupTimings]
+    result["resources"] = getResourceReport()
+    result["earcons"] = {
+        "superseded": earconThrottle.superseded,
+        "dropped": earconThrottle.dropped,
+        "shortened": earconThrottle.shortened,
+    }
+    with open(fileName, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=4)
 
 def myAssert(condition):
     if not condition:
@@ -102,14 +349,27 @@ class Worker(Thread):
 
 
 class ThreadPool:
-    """ Pool of threads consuming tasks from a queue """
+    """ Pool of threads consuming tasks from a queue. Threads are started on first task. """
     def __init__(self, num_threads):
+        self.num_threads = num_threads
         self.tasks = Queue(num_threads)
-        for _ in range(num_threads):
-            Worker(self.tasks)
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.started:
+                return
+            startTime = time.perf_counter()
+            for _ in range(self.num_threads):
+                Worker(self.tasks)
+            self.started = True
+            recordStartup("threadPool", startTime)
 
     def add_task(self, func, *args, **kargs):
         """ Add a task to the queue """
+        if not self.started:
+            self.start()
         self.tasks.put((func, args, kargs))
 
     def map(self, func, args_list):
@@ -122,6 +382,15 @@ class ThreadPool:
         self.tasks.join()
 
 
+class SystemClock:
+    """ Time source used for scheduling earcons; simulations substitute a virtual clock. """
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(max(0, seconds))
+
+clock = SystemClock()
 threadPool = ThreadPool(5)
 pp = "earconFrenzy"
 defaultRules = """
@@ -129,19 +398,217 @@ defaultRules = """
 def initConfiguration():
     confspec = {
         "enabled" : "boolean( default=True)",
+        "roleSounds" : "string( default='')",
+        "stateSounds" : "string( default='')",
+        "spatialPanning" : "boolean( default=False)",
+        "interauralDelay" : "integer( default=0, min=0, max=1000)",
+        "supersedeEarcons" : "boolean( default=True)",
+        "maxActiveChains" : "integer( default=2, min=1, max=16)",
+        "rapidInterval" : "integer( default=150, min=0, max=2000)",
+        "rapidMaxDuration" : "integer( default=80, min=10, max=2000)",
+        "traceLevel" : "integer( default=0, min=0, max=2)",
+        "traceBufferSize" : "integer( default=1048576, min=4096)",
     }
     config.conf.spec[pp] = confspec
 
-
-ppSynchronousPlayer = nvwave.WavePlayer(channels=2, samplesPerSec=int(tones.SAMPLE_RATE), bitsPerSample=16, outputDevice=config.conf["speech"]["outputDevice"],wantDucking=True)
+def applyTraceConfiguration():
+    setTraceLevel(config.conf[pp]["traceLevel"], config.conf[pp]["traceBufferSize"])
+
+SettingsSnapshot = collections.namedtuple(
+    "SettingsSnapshot",
+    "enabled formatConfig extraDetailFormatConfig roleSounds stateSounds spatialPanning interauralDelay supersedeEarcons maxActiveChains rapidInterval rapidMaxDuration timestamp",
+)
+# Settings read on every speech call are taken from this snapshot instead of
+# profile-aware config lookups. It is refreshed on config save, reset and profile switch.
+# Changes made without a notification, e.g. in NVDA settings dialog, are picked up
+# once the snapshot is older than settingsSnapshotMaxAge seconds.
+# formatConfig dicts are shared between calls and must not be modified.
+settingsSnapshot = None
+settingsSnapshotMaxAge = 2.0
+
+def refreshSettings(*args, **kwargs):
+    global settingsSnapshot
+    oldSnapshot = settingsSnapshot
+    formatConfig = config.conf["documentFormatting"].copy()
+    extraDetailFormatConfig = formatConfig.copy()
+    extraDetailFormatConfig['extraDetail'] = True
+    snapshot = SettingsSnapshot(
+        enabled=bool(config.conf[pp]["enabled"]),
+        formatConfig=formatConfig,
+        extraDetailFormatConfig=extraDetailFormatConfig,
+        roleSounds=config.conf[pp]["roleSounds"],
+        stateSounds=config.conf[pp]["stateSounds"],
+        spatialPanning=bool(config.conf[pp]["spatialPanning"]),
+        interauralDelay=config.conf[pp]["interauralDelay"],
+        supersedeEarcons=bool(config.conf[pp]["supersedeEarcons"]),
+        maxActiveChains=config.conf[pp]["maxActiveChains"],
+        rapidInterval=config.conf[pp]["rapidInterval"],
+        rapidMaxDuration=config.conf[pp]["rapidMaxDuration"],
+        timestamp=time.monotonic(),
+    )
+    settingsSnapshot = snapshot
+    if oldSnapshot is not None:
+        # Sounds can differ between profiles
+        if snapshot.roleSounds != oldSnapshot.roleSounds:
+            reloadRoleSounds()
+        if snapshot.stateSounds != oldSnapshot.stateSounds:
+            reloadStateSounds()
+    return snapshot
+
+def getSettings():
+    snapshot = settingsSnapshot
+    if snapshot is None or time.monotonic() - snapshot.timestamp > settingsSnapshotMaxAge:
+        snapshot = refreshSettings()
+    return snapshot
+
+configChangeNotifications = ["post_configProfileSwitch", "post_configSave", "post_configReset"]
+
+
+# Opened on first beep
+ppSynchronousPlayer = None
+def getSynchronousPlayer():
+    global ppSynchronousPlayer
+    if ppSynchronousPlayer is None:
+        startTime = time.perf_counter()
+        ppSynchronousPlayer = nvwave.WavePlayer(channels=2, samplesPerSec=int(tones.SAMPLE_RATE), bitsPerSample=16, outputDevice=config.conf["speech"]["outputDevice"],wantDucking=True)
+        recordStartup("synchronousPlayer", startTime)
+    return ppSynchronousPlayer
 
 class PpSynchronousCommand(speech.commands.BaseCallbackCommand):
+    """
+    run is called by the speech manager and plays the sound under the policies of earconThrottle.
+    play takes an optional maxDuration in milliseconds, used to shorten sounds under key repeat.
+    """
+    def run(self):
+        earconThrottle.admit(self)
+        try:
+            self.play(earconThrottle.getMaxDuration())
+        finally:
+            earconThrottle.release(self)
+    def play(self, maxDuration=None):
+        raise NotImplementedError()
     def getDuration(self):
         raise NotImplementedError()
     def terminate(self):
         raise NotImplementedError()
+    def getEarconClass(self):
+        # Earcons sharing an earcon class supersede each other, see EarconThrottle.
+        return type(self).__name__
+    def getEarconClasses(self):
+        return frozenset((self.getEarconClass(),))
+    def release(self):
+        """ Frees players and buffers of a command that is no longer used. """
+        pass
+
+# Helpers for 16-bit little endian samples.
+# They call audioop when it is available, and compute the same results with arrays otherwise,
+# except for resampling.
+
+def unpackSamples(buf):
+    samples = array.array("h", buf)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+def packSamples(samples):
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples.tobytes()
+
+def boundSample(value):
+    # Like audioop: clipped to 16 bits, rounded down.
+    return min(32767, max(-32768, math.floor(value)))
+
+def mulSamples(buf, factor):
+    if audioop is not None:
+        return audioop.mul(buf, 2, factor)
+    return packSamples(array.array("h", [boundSample(sample * factor) for sample in unpackSamples(buf)]))
+
+def toMonoSamples(buf, leftGain, rightGain):
+    if audioop is not None:
+        return audioop.tomono(buf, 2, leftGain, rightGain)
+    samples = unpackSamples(buf)
+    return packSamples(array.array("h", [
+        boundSample(left * leftGain + right * rightGain)
+        for left, right in zip(samples[0::2], samples[1::2])
+    ]))
+
+def toStereoSamples(buf, leftGain, rightGain):
+    if audioop is not None:
+        return audioop.tostereo(buf, 2, leftGain, rightGain)
+    samples = unpackSamples(buf)
+    result = array.array("h", bytes(4 * len(samples)))
+    result[0::2] = array.array("h", [boundSample(sample * leftGain) for sample in samples])
+    result[1::2] = array.array("h", [boundSample(sample * rightGain) for sample in samples])
+    return packSamples(result)
+
+def addSamples(buf1, buf2):
+    if audioop is not None:
+        return audioop.add(buf1, buf2, 2)
+    return packSamples(array.array("h", [
+        min(32767, max(-32768, a + b))
+        for a, b in zip(unpackSamples(buf1), unpackSamples(buf2))
+    ]))
+
+def resampleSamples(buf, channels, inRate, outRate, state):
+    """
+    Converts frame rate by linear interpolation, returns (samples, state).
+    state carries position and last frame over to the next chunk of the same stream, None at its start.
+    Without audioop the result is close to, but not identical with, audioop.ratecv.
+    """
+    if audioop is not None:
+        return audioop.ratecv(buf, 2, channels, inRate, outRate, state)
+    samples = unpackSamples(buf)
+    frameCount = len(samples) // channels
+    if state is None:
+        # Position is counted in 1/outRate of input frames, where frame 0 is the last frame of the previous chunk.
+        # It is kept integer, so that chunks of a stream add up to the same result as the whole stream.
+        position, previous = 0, array.array("h", bytes(2 * channels))
+    else:
+        position, previous = state
+    result = array.array("h")
+    while position < frameCount * outRate:
+        i, remainder = divmod(position, outRate)
+        fraction = remainder / outRate
+        for channel in range(channels):
+            a = previous[channel] if i == 0 else samples[(i - 1) * channels + channel]
+            b = samples[i * channels + channel]
+            result.append(boundSample(a + (b - a) * fraction))
+        position += inRate
+    if frameCount > 0:
+        previous = samples[(frameCount - 1) * channels:frameCount * channels]
+        position -= frameCount * outRate
+    return packSamples(result), (position, previous)
+
+# Length of fade out applied to shortened sounds, in milliseconds.
+shortenedFadeOut = 10
+
+def getFadeFrames(frames, rate):
+    return min(frames, shortenedFadeOut * rate // 1000)
+
+def shortenSamples(buf, channels, rate, maxDuration):
+    """ Cuts 16-bit samples to maxDuration milliseconds, fading out the end to avoid a click. """
+    frames = maxDuration * rate // 1000
+    return cutSamples(buf, channels, frames, getFadeFrames(frames, rate))
+
+def cutSamples(buf, channels, frames, fadeFrames):
+    """ Cuts 16-bit samples to frames, fading out the last fadeFrames of them. """
+    frameSize = 2 * channels
+    if frames * frameSize >= len(buf):
+        return buf
+    head = buf[:(frames - fadeFrames) * frameSize]
+    tail = buf[(frames - fadeFrames) * frameSize:frames * frameSize]
+    # Fade out in a few steps of decreasing gain
+    steps = 4
+    stepSize = len(tail) // frameSize // steps * frameSize
+    fadedTail = b"".join(
+        mulSamples(tail[i * stepSize:(i + 1) * stepSize if i < steps - 1 else len(tail)], (steps - i) / (steps + 1))
+        for i in range(steps)
+    )
+    return head + fadedTail
 
 class PpBeepCommand(PpSynchronousCommand):
+    captureFields = ("hz", "length", "left", "right")
     def __init__(self, hz, length, left=50, right=50):
         super().__init__()
         self.hz = hz
@@ -149,14 +616,17 @@ class PpBeepCommand(PpSynchronousCommand):
         self.left = left
         self.right = right
 
-    def run(self):
+    def play(self, maxDuration=None):
         from NVDAHelper import generateBeep
         hz,length,left,right = self.hz, self.length, self.left, self.right
+        if maxDuration is not None:
+            length = min(length, maxDuration)
         bufSize=generateBeep(None,hz,length,left,right)
         buf=create_string_buffer(bufSize)
         generateBeep(buf,hz,length,left,right)
-        ppSynchronousPlayer.feed(buf.raw)
-        ppSynchronousPlayer.idle()
+        player = getSynchronousPlayer()
+        player.feed(buf.raw)
+        player.idle()
 
     def getDuration(self):
         return self.length
@@ -166,98 +636,460 @@ class PpBeepCommand(PpSynchronousCommand):
             hz=self.hz, length=self.length, left=self.left, right=self.right)
 
     def terminate(self):
-        ppSynchronousPlayer.stop()
+        if ppSynchronousPlayer is not None:
+            ppSynchronousPlayer.stop()
+
+# Every wave command that hasn't been garbage collected, for resource reports.
+liveWaveCommands = weakref.WeakSet()
+
+def releaseCommands(commands, keep=()):
+    """ Releases commands, except those in keep, which are compared by identity. """
+    keepIds = {id(command) for command in keep}
+    for command in commands:
+        if id(command) not in keepIds:
+            command.release()
+
+def getRuleCommands(rules):
+    return [
+        command
+        for rule in rules
+        for command in (rule.speechCommand, rule.postSpeechCommand)
+        if isinstance(command, PpSynchronousCommand)
+    ]
+
+# Wave files larger than this are streamed from disk instead of being decoded up front.
+streamingThreshold = 4 * 1024 * 1024
+streamingChunkMillis = 100
 
 class PpWaveFileCommand(PpSynchronousCommand):
-    def __init__(self, fileName, startAdjustment=0, endAdjustment=0, volume=100):
+    """
+    Wave file is decoded and its player opened on first use, see prepare.
+    pitch above 1 shifts the sound up by resampling, making it shorter, and below 1 shifts it down.
+    The file is only read while decoding: header values needed later are kept in the command.
+    Wave files above streamingThreshold are instead read, converted and fed in chunks on every run,
+    so memory doesn't grow with their length. Streamed sounds are panned without interaural delay.
+    release frees players and buffers; a released command prepares itself again if it is still run.
+    """
+    captureFields = ("fileName", "startAdjustment", "endAdjustment", "volume", "pitch")
+    captureDefaults = {"pitch": 1.0}
+    def __init__(self, fileName, startAdjustment=0, endAdjustment=0, volume=100, pitch=1.0):
+        super().__init__()
         self.fileName = fileName
         self.startAdjustment = startAdjustment
         self.endAdjustment = endAdjustment
         self.volume = volume
-        self.f = wave.open(self.fileName,"r")
-        f = self.f
-        if self.f is None:
-            raise RuntimeError("can not open file %s"%self.fileName)
-        if f.getsampwidth() != 2:
-            bits = f.getsampwidth() * 8
-            raise RuntimeError(f"We only support 16-bit encoded wav files. '{fileName}' is encoded with {bits} bits per sample.")
-        buf =  f.readframes(f.getnframes())
-        bufSize = len(buf)
-        n = bufSize//2
-        unpacked = struct.unpack(f"<{n}h", buf)
-        unpacked = list(unpacked)
-        for i in range(n):
-            unpacked[i] = int(unpacked[i] * volume/100)
+        self.pitch = pitch
+        self.buf = None
+        self.fileWavePlayer = None
+        self.failed = False
+        self.prepared = False
+        self.streamFileName = None
+        # Bumped to stop a stream being played
+        self.streamGeneration = 0
+        self.channels = None
+        self.monoBuf = None
+        self.stereoWavePlayer = None
+        # (pan, delay, buffer) of the last panned playback
+        self.pannedBuf = None
+        liveWaveCommands.add(self)
+
+    def prepare(self):
+        """ Decodes the file and opens its player, raising an error if the file can't be played. """
+        if self.prepared:
+            return
+        fileName = findSoundFile(self.fileName)
+        if not fileName.endswith(compressedSoundExtension) and os.path.getsize(fileName) > streamingThreshold:
+            self.prepareStream(fileName)
+            return
+        startTime = time.perf_counter()
+        decoded = decodedWaveCache.get(self.fileName)
+        if decoded.sampleWidth != 2:
+            bits = decoded.sampleWidth * 8
+            raise RuntimeError(f"We only support 16-bit encoded wav files. '{self.fileName}' is encoded with {bits} bits per sample.")
+        buf = decoded.frames
+        if self.pitch != 1:
+            buf, _state = resampleSamples(buf, decoded.channels, int(round(decoded.rate * self.pitch)), decoded.rate, None)
+        frameCount = len(buf) // (decoded.channels * decoded.sampleWidth)
+        volume = self.volume
+        if volume != 100:
+            buf = mulSamples(buf, volume / 100)
         if self.startAdjustment > 0:
-            pos = self.startAdjustment * f.getframerate() // 1000
-            pos *= f.getnchannels()
-            unpacked = unpacked[pos:]
-            n = len(unpacked)
-        packed = struct.pack(f"<{n}h", *unpacked)
-        self.buf = packed
-        self.fileWavePlayer = nvwave.WavePlayer(channels=f.getnchannels(), samplesPerSec=f.getframerate(),bitsPerSample=f.getsampwidth()*8, outputDevice=config.conf["speech"]["outputDevice"],wantDucking=False)
+            pos = self.startAdjustment * decoded.rate // 1000
+            pos *= decoded.channels * decoded.sampleWidth
+            buf = buf[pos:]
+        # Otherwise buf is the decoded cache entry itself and is not copied.
+        recordLatency("wavDecode", startTime)
+        self.frameCount = frameCount
+        self.rate = decoded.rate
+        self.channels = decoded.channels
+        self.fileWavePlayer = nvwave.WavePlayer(channels=decoded.channels, samplesPerSec=decoded.rate,bitsPerSample=decoded.sampleWidth*8, outputDevice=config.conf["speech"]["outputDevice"],wantDucking=False)
+        self.buf = buf
+        self.prepared = True
+
+    def prepareStream(self, fileName):
+        """ Reads only the header of a streamed file and opens its player. """
+        with wave.open(fileName, "rb") as f:
+            channels = f.getnchannels()
+            rate = f.getframerate()
+            sampleWidth = f.getsampwidth()
+            frameCount = f.getnframes()
+        if sampleWidth != 2:
+            raise RuntimeError(f"We only support 16-bit encoded wav files. '{self.fileName}' is encoded with {sampleWidth * 8} bits per sample.")
+        self.frameCount = int(frameCount / self.pitch)
+        self.rate = rate
+        self.channels = channels
+        self.streamFileName = fileName
+        self.fileWavePlayer = nvwave.WavePlayer(channels=channels, samplesPerSec=rate, bitsPerSample=16, outputDevice=config.conf["speech"]["outputDevice"], wantDucking=False)
+        self.prepared = True
+
+    def tryPrepare(self):
+        if not self.prepared and not self.failed:
+            try:
+                self.prepare()
+            except Exception as e:
+                self.failed = True
+                log.error(f"Failed to load earcon frenzy sound {self.fileName}", e)
+        return not self.failed
 
-    def run(self):
-        f = self.f
-        f.rewind()
+    def play(self, maxDuration=None):
+        if not self.tryPrepare():
+            return
         if self.startAdjustment < 0:
-            time.sleep(-self.startAdjustment / 1000.0)
+            clock.sleep(-self.startAdjustment / 1000.0)
         elif self.startAdjustment > 0:
-            # this is now handled in __init__
+            # this is now handled in prepare
             pass
-        fileWavePlayer = self.fileWavePlayer
+        pan = spatialPan
+        if self.streamFileName is not None:
+            self.runStream(pan, maxDuration)
+            return
+        if pan is None:
+            fileWavePlayer = self.fileWavePlayer
+            buf = self.buf
+        else:
+            fileWavePlayer = self.getStereoWavePlayer()
+            buf = self.getPannedBuffer(pan, spatialDelay)
+        if maxDuration is not None:
+            channels = self.channels if pan is None else 2
+            buf = shortenSamples(buf, channels, self.rate, maxDuration)
         fileWavePlayer.stop()
-        fileWavePlayer.feed(self.buf)
+        fileWavePlayer.feed(buf)
         fileWavePlayer.idle()
 
+    def runStream(self, pan, maxDuration):
+        # A stream of this command that is still playing stops at its next chunk.
+        self.streamGeneration += 1
+        generation = self.streamGeneration
+        rate = self.rate
+        channels = self.channels
+        pitch = self.pitch
+        volume = self.volume
+        if pan is None:
+            player = self.fileWavePlayer
+            outputChannels = channels
+        else:
+            player = self.getStereoWavePlayer()
+            outputChannels = 2
+        # Frames still to be played, None for the whole file
+        remaining = None if maxDuration is None else maxDuration * rate // 1000
+        if remaining is not None:
+            fadeFrames = getFadeFrames(remaining, rate)
+            frameSize = 2 * outputChannels
+        # Frames held back until we know whether they are faded out
+        pending = b""
+        chunkFrames = max(1, int(streamingChunkMillis * rate * pitch / 1000))
+        ratecvState = None
+        player.stop()
+        with wave.open(self.streamFileName, "rb") as f:
+            if self.startAdjustment > 0:
+                f.setpos(min(f.getnframes(), int(self.startAdjustment * rate * pitch / 1000)))
+            while self.streamGeneration == generation:
+                data = f.readframes(chunkFrames)
+                if not data:
+                    break
+                if pitch != 1:
+                    data, ratecvState = resampleSamples(data, channels, int(round(rate * pitch)), rate, ratecvState)
+                if volume != 100:
+                    data = mulSamples(data, volume / 100)
+                if pan is not None:
+                    if channels == 2:
+                        data = toMonoSamples(data, 0.5, 0.5)
+                    data = panSamples(data, rate, pan)
+                if remaining is not None:
+                    data = pending + data
+                    frames = len(data) // frameSize
+                    if frames > remaining:
+                        data = cutSamples(data, outputChannels, remaining, fadeFrames)
+                        pending = b""
+                        remaining = 0
+                    else:
+                        fedFrames = min(frames, remaining - fadeFrames)
+                        pending = data[fedFrames * frameSize:]
+                        data = data[:fedFrames * frameSize]
+                        remaining -= fedFrames
+                if data:
+                    player.feed(data)
+                if remaining == 0:
+                    break
+        if self.streamGeneration == generation:
+            # The file ended before the cut
+            if pending:
+                player.feed(pending)
+            player.idle()
+
+    def getStereoWavePlayer(self):
+        if self.channels == 2:
+            return self.fileWavePlayer
+        if self.stereoWavePlayer is None:
+            self.stereoWavePlayer = nvwave.WavePlayer(channels=2, samplesPerSec=self.rate, bitsPerSample=16, outputDevice=config.conf["speech"]["outputDevice"], wantDucking=False)
+        return self.stereoWavePlayer
+
+    def getPannedBuffer(self, pan, delay):
+        pannedBuf = self.pannedBuf
+        if pannedBuf is not None and pannedBuf[0] == pan and pannedBuf[1] == delay:
+            return pannedBuf[2]
+        if self.monoBuf is None:
+            if self.channels == 2:
+                self.monoBuf = toMonoSamples(self.buf, 0.5, 0.5)
+            else:
+                self.monoBuf = self.buf
+        buf = panSamples(self.monoBuf, self.rate, pan, delay)
+        self.pannedBuf = (pan, delay, buf)
+        return buf
+
     def getDuration(self):
-        frames = self.f.getnframes()
-        rate = self.f.getframerate()
-        wavMillis = int(1000 * frames / rate)
+        if not self.tryPrepare():
+            return 0
+        wavMillis = int(1000 * self.frameCount / self.rate)
         result = wavMillis - self.startAdjustment - self.endAdjustment
         return max(0, result)
 
+    def getEarconClass(self):
+        return self.fileName
+
     def __repr__(self):
+        if self.pitch != 1:
+            return "PpWaveFileCommand(%r, pitch=%r)" % (self.fileName, self.pitch)
         return "PpWaveFileCommand(%r)" % self.fileName
 
     def terminate(self):
-        self.fileWavePlayer.stop()
+        self.streamGeneration += 1
+        if self.fileWavePlayer is not None:
+            self.fileWavePlayer.stop()
+        if self.stereoWavePlayer is not None:
+            self.stereoWavePlayer.stop()
+
+    def release(self):
+        players = [player for player in (self.fileWavePlayer, self.stereoWavePlayer) if player is not None]
+        self.streamGeneration += 1
+        self.prepared = False
+        self.streamFileName = None
+        self.buf = None
+        self.monoBuf = None
+        self.pannedBuf = None
+        self.fileWavePlayer = None
+        self.stereoWavePlayer = None
+        for player in players:
+            try:
+                player.stop()
+                player.close()
+            except Exception as e:
+                log.error(f"Failed to close earcon frenzy player for {self.fileName}", e)
+
+    def getBufferBytes(self):
+        pannedBuf = self.pannedBuf[2] if self.pannedBuf is not None else None
+        # Mono buffer of a mono file is buf itself, so buffers are counted once by identity.
+        buffers = {id(buf): len(buf) for buf in (self.buf, self.monoBuf, pannedBuf) if buf is not None}
+        return sum(buffers.values())
+
+    def getPlayerCount(self):
+        return (self.fileWavePlayer is not None) + (self.stereoWavePlayer is not None)
+
+# Position of the focused object, -1 is the left edge of the screen and 1 is the right edge.
+# None when spatial panning is off. Updated on focus change, see updateSpatialPan.
+spatialPan = None
+spatialPanStep = 0.05
+# Interaural delay of the far ear at full pan, in microseconds.
+spatialDelay = 0
+
+def getObjectPan(obj):
+    location = obj.location
+    screen = api.getDesktopObject().location
+    if not location or not screen or screen[2] <= 0:
+        return None
+    center = location[0] + location[2] / 2
+    pan = 2 * (center - screen[0]) / screen[2] - 1
+    pan = max(-1.0, min(1.0, pan))
+    # Quantized so that panned buffers can be reused
+    return round(pan / spatialPanStep) * spatialPanStep
+
+def updateSpatialPan(obj):
+    global spatialPan, spatialDelay
+    settings = getSettings()
+    if not settings.spatialPanning:
+        spatialPan = None
+        return
+    spatialDelay = settings.interauralDelay
+    try:
+        spatialPan = getObjectPan(obj)
+    except Exception as e:
+        log.error("Failed to get earcon frenzy focus position", e)
+        spatialPan = None
+
+def panSamples(monoBuf, rate, pan, delay=0):
+    """
+    Pans 16-bit mono samples into 16-bit stereo samples.
+    Gains follow equal power law scaled to unity at the center, so centered sounds keep their volume.
+    delay is in microseconds at full pan; the ear further from the sound hears it later.
+    """
+    angle = (pan + 1) * math.pi / 4
+    leftGain = min(1.0, math.sqrt(2) * math.cos(angle))
+    rightGain = min(1.0, math.sqrt(2) * math.sin(angle))
+    delayFrames = int(round(abs(pan) * delay * rate / 1000000))
+    if delayFrames == 0:
+        return toStereoSamples(monoBuf, leftGain, rightGain)
+    padding = bytes(2 * delayFrames)
+    near = monoBuf + padding
+    far = padding + monoBuf
+    left, right = (far, near) if pan > 0 else (near, far)
+    return addSamples(
+        toStereoSamples(left, leftGain, 0),
+        toStereoSamples(right, 0, rightGain),
+    )
+
+class EarconThrottle:
+    """
+    Keeps audio backlog bounded under key repeat, e.g. when holding down arrow or pressing h repeatedly.
+    Earcons are bare commands run by the speech manager, or chains.
+    Policies are configured in settings:
+    supersedeEarcons - a starting earcon stops older earcons sharing an earcon class with it;
+    maxActiveChains - oldest earcons are stopped to keep at most this many playing;
+    rapidInterval, rapidMaxDuration - when a navigation event comes less than rapidInterval ms
+    after the previous one, sounds starting less than rapidInterval ms after it are cut to rapidMaxDuration ms.
+    NVDA cancels speech on every navigation gesture, including key repeats,
+    so navigation events are counted in speech cancellation.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.activeEarcons = []
+        self.lastNavigationTime = None
+        self.rapid = False
+        self.superseded = 0
+        self.dropped = 0
+        self.shortened = 0
+
+    def noteNavigation(self):
+        settings = getSettings()
+        now = clock.time()
+        lastNavigationTime = self.lastNavigationTime
+        self.lastNavigationTime = now
+        self.rapid = lastNavigationTime is not None and 0 <= now - lastNavigationTime < settings.rapidInterval / 1000
+
+    def getMaxDuration(self):
+        """ Called when an earcon starts or a chain is created, returns maximum duration of its sounds or None. """
+        settings = getSettings()
+        if not self.rapid or settings.rapidInterval <= 0:
+            return None
+        if clock.time() - self.lastNavigationTime >= settings.rapidInterval / 1000:
+            return None
+        self.shortened += 1
+        return settings.rapidMaxDuration
+
+    def admit(self, earcon):
+        """ Called when an earcon starts playing, stops earcons it supersedes or that exceed the cap. """
+        settings = getSettings()
+        earconClasses = earcon.getEarconClasses()
+        with self.lock:
+            if settings.supersedeEarcons:
+                superseded = [other for other in self.activeEarcons if not other.getEarconClasses().isdisjoint(earconClasses)]
+            else:
+                superseded = []
+            remaining = [other for other in self.activeEarcons if other not in superseded]
+            excess = max(0, len(remaining) + 1 - settings.maxActiveChains)
+            dropped = remaining[:excess]
+            self.activeEarcons = remaining[excess:] + [earcon]
+            self.superseded += len(superseded)
+            self.dropped += len(dropped)
+        for other in superseded + dropped:
+            other.terminate()
+
+    def release(self, earcon):
+        with self.lock:
+            if earcon in self.activeEarcons:
+                self.activeEarcons.remove(earcon)
+
+    def terminateAll(self):
+        with self.lock:
+            earcons = self.activeEarcons
+            self.activeEarcons = []
+        for earcon in earcons:
+            earcon.terminate()
+
+earconThrottle = EarconThrottle()
 
-currentChain = None
 class PpChainCommand(PpSynchronousCommand):
-    def __init__(self, subcommands):
+    """
+    Plays subcommands one after another on the thread pool.
+    With maxDuration, in milliseconds, each subcommand is cut to at most that long.
+    """
+    captureFields = ("subcommands", "maxDuration")
+    captureDefaults = {"maxDuration": None}
+    def __init__(self, subcommands, maxDuration=None):
         super().__init__()
         self.subcommands = subcommands
+        self.maxDuration = maxDuration
+        self.earconClasses = frozenset(subcommand.getEarconClass() for subcommand in subcommands)
         self.terminated = False
 
+    def getEarconClasses(self):
+        return self.earconClasses
+
     def run(self):
-        global currentChain
-        currentChain = self
+        earconThrottle.admit(self)
+        self.runTime = time.perf_counter()
         threadPool.add_task(self.threadFunc)
 
+    def getSubcommandDuration(self, subcommand):
+        duration = subcommand.getDuration()
+        if self.maxDuration is not None:
+            duration = min(duration, self.maxDuration)
+        return duration
+
     def getDuration(self):
-        return sum([subcommand.getDuration() for subcommand in self.subcommands])
+        return sum([self.getSubcommandDuration(subcommand) for subcommand in self.subcommands])
 
     def threadFunc(self):
-        timestamp = time.time()
-        for subcommand in self.subcommands:
+        recordLatency("chainScheduling", self.runTime)
+        timestamp = clock.time()
+        for i, subcommand in enumerate(self.subcommands):
             if self.terminated:
                 return
-            threadPool.add_task(subcommand.run)
-            timestamp += subcommand.getDuration() / 1000
-            sleepTime = timestamp - time.time()
-            time.sleep(sleepTime)
-        currentChain = None
+            if i == 0:
+                threadPool.add_task(self.runFirstSubcommand, subcommand)
+            else:
+                threadPool.add_task(self.runSubcommand, subcommand)
+            timestamp += self.getSubcommandDuration(subcommand) / 1000
+            sleepTime = timestamp - clock.time()
+            clock.sleep(sleepTime)
+        earconThrottle.release(self)
+
+    def runFirstSubcommand(self, subcommand):
+        recordLatency("timeToFirstSample", self.runTime)
+        self.runSubcommand(subcommand)
+
+    def runSubcommand(self, subcommand):
+        # The pool may only get to it after the chain was stopped.
+        if not self.terminated:
+            subcommand.play(self.maxDuration)
 
     def __repr__(self):
         return f"PpChainCommand({self.subcommands})"
 
     def terminate(self):
-        global currentChain
         self.terminated = True
         for subcommand in self.subcommands:
             subcommand.terminate()
-        currentChain = None
+        earconThrottle.release(self)
 
 def getSoundsPath():
     globalPluginPath = os.path.abspath(os.path.dirname(__file__))
@@ -265,37 +1097,553 @@ def getSoundsPath():
     soundsPath = os.path.join(addonPath, "sounds")
     return soundsPath
 
+DecodedWave = collections.namedtuple("DecodedWave", "channels rate sampleWidth frames")
+
+# Built in sounds may be shipped losslessly compressed, see tools/packSounds.py.
+# A compressed sound is stored next to where its wave file would be, with compressedSoundExtension,
+# and is still referred to by its .wav name everywhere.
+# Layout: compressedSoundHeader, then for each stored channel its array type code, compressed length
+# and zlib compressed little-endian differences between consecutive samples.
+compressedSoundExtension = ".efz"
+compressedSoundMagic = b"EFZ1"
+compressedSoundHeader = struct.Struct("<4sHIBBI")
+compressedSoundChannelHeader = struct.Struct("<cI")
+# Stereo sound with identical channels; only the first channel is stored.
+compressedSoundDualMono = 1
+# Second channel is stored as difference from the first one.
+compressedSoundSide = 2
+
+def decodeCompressedSound(data):
+    magic, channels, rate, sampleWidth, flags, frameCount = compressedSoundHeader.unpack_from(data)
+    if magic != compressedSoundMagic or sampleWidth != 2:
+        raise ValueError("Not an earcon frenzy compressed sound")
+    offset = compressedSoundHeader.size
+    stored = []
+    while offset < len(data):
+        typeCode, length = compressedSoundChannelHeader.unpack_from(data, offset)
+        offset += compressedSoundChannelHeader.size
+        deltas = array.array(typeCode.decode("ascii"), zlib.decompress(data[offset:offset + length]))
+        offset += length
+        if sys.byteorder == "big":
+            deltas.byteswap()
+        stored.append(array.array("i", itertools.accumulate(deltas)))
+    if flags & compressedSoundDualMono:
+        stored.append(stored[0])
+    elif flags & compressedSoundSide:
+        stored[1] = array.array("i", map(operator.add, stored[0], stored[1]))
+    if len(stored) != channels or any(len(channel) != frameCount for channel in stored):
+        raise ValueError("Corrupted earcon frenzy compressed sound")
+    samples = array.array("h", bytes(2 * channels * frameCount))
+    for i, channel in enumerate(stored):
+        samples[i::channels] = array.array("h", channel)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return DecodedWave(channels, rate, sampleWidth, samples.tobytes())
+
+def findSoundFile(fileName):
+    """ Returns fileName, or its compressed counterpart if only that exists. """
+    if os.path.exists(fileName):
+        return fileName
+    compressedFileName = os.path.splitext(fileName)[0] + compressedSoundExtension
+    if os.path.exists(compressedFileName):
+        return compressedFileName
+    return fileName
+
+def readDecodedWave(fileName):
+    fileName = findSoundFile(fileName)
+    if fileName.endswith(compressedSoundExtension):
+        with open(fileName, "rb") as f:
+            return decodeCompressedSound(f.read())
+    with wave.open(fileName, "rb") as f:
+        return DecodedWave(
+            channels=f.getnchannels(),
+            rate=f.getframerate(),
+            sampleWidth=f.getsampwidth(),
+            frames=f.readframes(f.getnframes()),
+        )
 
-if True:
-    wavFile = os.path.join(getSoundsPath(), r"unspoken\button.wav")
-    buttonCommand = PpWaveFileCommand(
-        wavFile,
-        startAdjustment=0,
-        endAdjustment=0,
-        volume=100,
-    )
-    wavFile = os.path.join(getSoundsPath(), r"classic\on.wav")
-    onCommand = PpWaveFileCommand(
-        wavFile,
-        startAdjustment=0,
-        endAdjustment=0,
-        volume=100,
+def listSoundFiles(soundsPath):
+    """ Yields category, wave file name and path of the file on disk for every built in sound. """
+    for category in os.listdir(soundsPath):
+        categoryPath = os.path.join(soundsPath, category)
+        if not os.path.isdir(categoryPath):
+            continue
+        for fileName in os.listdir(categoryPath):
+            name, ext = os.path.splitext(fileName)
+            if ext.lower() == ".wav":
+                yield category, fileName, os.path.join(categoryPath, fileName)
+            elif ext.lower() == compressedSoundExtension and not os.path.exists(os.path.join(categoryPath, name + ".wav")):
+                yield category, name + ".wav", os.path.join(categoryPath, fileName)
+
+SoundInfo = collections.namedtuple(
+    "SoundInfo",
+    "name category fileName size duration channels rate sampleWidth peak",
+)
+soundCatalogFileName = "catalog.json"
+soundCatalogVersion = 1
+
+def readSoundInfo(soundsPath, category, fileName):
+    fullPath = findSoundFile(os.path.join(soundsPath, category, fileName))
+    channels, rate, sampleWidth, frames = readDecodedWave(fullPath)
+    nFrames = len(frames) // (channels * sampleWidth)
+    if sampleWidth == 1:
+        # 8-bit samples are unsigned
+        peak = max((abs(b - 128) for b in frames), default=0) / 128
+    elif sampleWidth == 2:
+        samples = array.array("h", frames[:len(frames) // 2 * 2])
+        peak = max(max(samples, default=0), -min(samples, default=0)) / 32768
+    else:
+        peak = None
+    return SoundInfo(
+        name=f"{category}/{fileName}",
+        category=category,
+        fileName=fileName,
+        size=os.path.getsize(fullPath),
+        duration=nFrames / rate if rate else 0.0,
+        channels=channels,
+        rate=rate,
+        sampleWidth=sampleWidth,
+        peak=peak,
     )
-    wavFile = os.path.join(getSoundsPath(), r"classic\off.wav")
-    offCommand = PpWaveFileCommand(
-        wavFile,
-        startAdjustment=0,
-        endAdjustment=0,
-        volume=100,
+
+class SoundCatalog:
+    """
+    Index of built in sounds by category and name.
+    Names have the form category/file.wav regardless of platform.
+    """
+    def __init__(self, sounds):
+        self.sounds = sorted(sounds, key=lambda info: info.name.lower())
+        self.byName = {info.name.lower(): info for info in self.sounds}
+        self.keys = [info.name.lower() for info in self.sounds]
+        self.byCategory = collections.OrderedDict()
+        for info in self.sounds:
+            self.byCategory.setdefault(info.category, []).append(info)
+
+    def categories(self):
+        return list(self.byCategory.keys())
+
+    def soundsInCategory(self, category):
+        return self.byCategory.get(category, [])
+
+    def get(self, name):
+        return self.byName.get("/".join(re.split(r"[\\/]", name)).lower())
+
+    def startsWith(self, prefix):
+        prefix = prefix.lower()
+        i = bisect.bisect_left(self.keys, prefix)
+        result = []
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            result.append(self.sounds[i])
+            i += 1
+        return result
+
+    def search(self, text):
+        """Sounds whose name or file name starts with text come first, followed by other sounds containing text."""
+        text = text.lower()
+        prefixMatches = []
+        otherMatches = []
+        for key, info in zip(self.keys, self.sounds):
+            if key.startswith(text) or info.fileName.lower().startswith(text):
+                prefixMatches.append(info)
+            elif text in key:
+                otherMatches.append(info)
+        return prefixMatches + otherMatches
+
+    def toJson(self):
+        return {
+            "version": soundCatalogVersion,
+            "sounds": [info._asdict() for info in self.sounds],
+        }
+
+def scanSoundCatalog(soundsPath=None):
+    soundsPath = soundsPath or getSoundsPath()
+    sounds = []
+    for category, fileName, _path in listSoundFiles(soundsPath):
+        try:
+            sounds.append(readSoundInfo(soundsPath, category, fileName))
+        except (OSError, EOFError, ValueError, zlib.error, wave.Error) as e:
+            log.error(f"Failed to read earcon frenzy sound {category}/{fileName}", e)
+    return SoundCatalog(sounds)
+
+def loadSoundCatalogManifest(soundsPath):
+    """
+    Loads the manifest written at build time by tools/buildSoundCatalog.py.
+    Returns None if there is no manifest or it doesn't match files on disk.
+    """
+    manifestPath = os.path.join(soundsPath, soundCatalogFileName)
+    try:
+        with open(manifestPath, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.error("Failed to load earcon frenzy sound catalog", e)
+        return None
+    if manifest.get("version") != soundCatalogVersion:
+        return None
+    try:
+        sounds = [SoundInfo(**entry) for entry in manifest["sounds"]]
+    except (KeyError, TypeError) as e:
+        log.error("Invalid earcon frenzy sound catalog", e)
+        return None
+    sizes = {
+        f"{category}/{fileName}": os.path.getsize(path)
+        for category, fileName, path in listSoundFiles(soundsPath)
+    }
+    if sizes != {info.name: info.size for info in sounds}:
+        return None
+    return SoundCatalog(sounds)
+
+soundCatalog = None
+soundCatalogLock = threading.Lock()
+def getSoundCatalog():
+    global soundCatalog
+    with soundCatalogLock:
+        if soundCatalog is None:
+            soundsPath = getSoundsPath()
+            soundCatalog = loadSoundCatalogManifest(soundsPath) or scanSoundCatalog(soundsPath)
+        return soundCatalog
+
+class DecodedWaveCache:
+    """ Least recently used cache of decoded wave files, keyed by path. """
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.totalBytes = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, fileName):
+        with self.lock:
+            decoded = self.entries.get(fileName)
+            if decoded is not None:
+                self.entries.move_to_end(fileName)
+                return decoded
+        decoded = readDecodedWave(fileName)
+        with self.lock:
+            if fileName not in self.entries:
+                self.entries[fileName] = decoded
+                self.totalBytes += len(decoded.frames)
+                while self.totalBytes > self.maxBytes and len(self.entries) > 1:
+                    _name, evicted = self.entries.popitem(last=False)
+                    self.totalBytes -= len(evicted.frames)
+        return decoded
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.totalBytes = 0
+
+decodedWaveCache = DecodedWaveCache(32 * 1024 * 1024)
+
+class SoundPreviewer:
+    """
+    Plays sound previews for the rules dialog on its own thread and wave players.
+    Every new preview immediately cancels the previous one.
+    While idle, the thread decodes files that are likely to be previewed next.
+    """
+    chunkMillis = 50
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.pending = None
+        self.prefetch = []
+        self.players = {}
+        self.currentPlayer = None
+        self.thread = None
+
+    def play(self, fileName, prefetch=()):
+        with self.condition:
+            self.generation += 1
+            self.pending = fileName
+            self.prefetch = list(prefetch)
+            player = self.currentPlayer
+            if self.thread is None:
+                self.thread = Thread(target=self.threadFunc, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        if player is not None:
+            player.stop()
+
+    def stop(self):
+        with self.condition:
+            self.generation += 1
+            self.pending = None
+            self.prefetch = []
+            player = self.currentPlayer
+        if player is not None:
+            player.stop()
+
+    def getPlayer(self, decoded):
+        key = (decoded.channels, decoded.rate, decoded.sampleWidth)
+        player = self.players.get(key)
+        if player is None:
+            player = nvwave.WavePlayer(
+                channels=decoded.channels,
+                samplesPerSec=decoded.rate,
+                bitsPerSample=decoded.sampleWidth * 8,
+                outputDevice=config.conf["speech"]["outputDevice"],
+                wantDucking=False,
+            )
+            self.players[key] = player
+        return player
+
+    def threadFunc(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.prefetch:
+                    self.condition.wait()
+                fileName = self.pending
+                generation = self.generation
+                self.pending = None
+                if fileName is None:
+                    prefetchName = self.prefetch.pop(0)
+            try:
+                if fileName is None:
+                    decodedWaveCache.get(prefetchName)
+                else:
+                    self.playFile(fileName, generation)
+            except Exception as e:
+                log.error("Error in earcon frenzy sound preview", e)
+
+    def playFile(self, fileName, generation):
+        decoded = decodedWaveCache.get(fileName)
+        player = self.getPlayer(decoded)
+        with self.condition:
+            if generation != self.generation:
+                return
+            self.currentPlayer = player
+        chunkSize = decoded.rate * decoded.channels * decoded.sampleWidth * self.chunkMillis // 1000
+        frames = decoded.frames
+        try:
+            for offset in range(0, len(frames), chunkSize):
+                if generation != self.generation:
+                    return
+                player.feed(frames[offset:offset + chunkSize])
+            if generation == self.generation:
+                player.idle()
+        finally:
+            with self.condition:
+                if self.currentPlayer is player:
+                    self.currentPlayer = None
+
+    def terminate(self):
+        self.stop()
+        for player in self.players.values():
+            player.close()
+        self.players = {}
+
+soundPreviewer = SoundPreviewer()
+
+def getProcessHandleCount():
+    """ Returns number of handles open in NVDA process, or None where it can't be queried. """
+    windll = getattr(ctypes, "windll", None)
+    if windll is None:
+        return None
+    count = ctypes.c_ulong()
+    if not windll.kernel32.GetProcessHandleCount(windll.kernel32.GetCurrentProcess(), byref(count)):
+        return None
+    return count.value
+
+def getResourceReport():
+    commands = list(liveWaveCommands)
+    commandPlayers = sum(command.getPlayerCount() for command in commands)
+    return {
+        "liveWaveCommands": len(commands),
+        "preparedWaveCommands": sum(command.prepared for command in commands),
+        "streamedWaveCommands": sum(command.streamFileName is not None for command in commands),
+        "commandBufferBytes": sum(command.getBufferBytes() for command in commands),
+        "decodedCacheEntries": len(decodedWaveCache.entries),
+        "decodedCacheBytes": decodedWaveCache.totalBytes,
+        "commandPlayers": commandPlayers,
+        "openPlayers": commandPlayers + (ppSynchronousPlayer is not None) + len(soundPreviewer.players),
+        "processHandles": getProcessHandleCount(),
+    }
+
+def formatResourceReport():
+    report = getResourceReport()
+    lines = [
+        _("Wave commands: {live} live, {prepared} prepared, {streamed} streamed, {bytes:.1f} KiB of buffers").format(
+            live=report["liveWaveCommands"], prepared=report["preparedWaveCommands"],
+            streamed=report["streamedWaveCommands"], bytes=report["commandBufferBytes"] / 1024),
+        _("Decoded sound cache: {n} files, {bytes:.1f} KiB").format(
+            n=report["decodedCacheEntries"], bytes=report["decodedCacheBytes"] / 1024),
+        _("Open players: {n}, of them {commands} held by wave commands").format(
+            n=report["openPlayers"], commands=report["commandPlayers"]),
+    ]
+    if report["processHandles"] is not None:
+        lines.append(_("NVDA process handles: {n}").format(n=report["processHandles"]))
+    return "\n".join(lines)
+
+
+headingSound = "chimes/help.wav"
+# Each heading level below 1 is this many semitones higher than the one above it.
+# Going up rather than down keeps deep headings short.
+headingLevelSemitones = 2
+headingMaxLevel = 6
+# Heading level to command, variants are created on first use and share the decoded base sound.
+headingCommands = {}
+
+def getHeadingCommand(level):
+    try:
+        return headingCommands[level]
+    except KeyError:
+        pass
+    steps = max(0, min(level, headingMaxLevel) - 1)
+    command = PpWaveFileCommand(
+        getBuiltInSoundPath(headingSound),
+        pitch=2 ** (steps * headingLevelSemitones / 12),
     )
-    wavFile = os.path.join(getSoundsPath(), r"chimes\help.wav")
-    headingCommand = PpWaveFileCommand(
-        wavFile,
-        startAdjustment=0,
-        endAdjustment=0,
-        volume=100,
+    headingCommands[level] = command
+    return command
+
+defaultRoleSounds = {
+    "BUTTON": "unspoken/button.wav",
+    "CHECKBOX": "unspoken/checkbox.wav",
+    "CLOCK": "unspoken/clock.wav",
+    "COMBOBOX": "unspoken/combobox.wav",
+    "EDITABLETEXT": "unspoken/editabletext.wav",
+    "LINK": "unspoken/link.wav",
+    "LISTITEM": "unspoken/listitem.wav",
+    "MENUITEM": "unspoken/menuitem.wav",
+    "RADIOBUTTON": "unspoken/radiobutton.wav",
+    "SLIDER": "unspoken/slider.wav",
+    "SPLITBUTTON": "unspoken/splitbutton.wav",
+    "TAB": "unspoken/tab.wav",
+    "TREEVIEWITEM": "unspoken/treeviewitem.wav",
+}
+
+def getBuiltInSoundPath(name):
+    # Built in sounds are referred to as category/file.wav
+    return os.path.join(getSoundsPath(), *name.split("/"))
+
+def getRoleSoundsConfig():
+    """
+    Role sounds are configured as a JSON object mapping role names to built in sounds, e.g.
+    {"LINK": "unspoken/link.wav", "BUTTON": ""}
+    Entries override defaultRoleSounds; an empty sound disables the earcon for that role.
+    """
+    result = dict(defaultRoleSounds)
+    roleSoundsJson = config.conf[pp]["roleSounds"]
+    if roleSoundsJson:
+        try:
+            result.update(json.loads(roleSoundsJson))
+        except ValueError as e:
+            log.error("Invalid earcon frenzy role sounds configuration", e)
+    return result
+
+# Role to earcon command; getPropertiesSpeech substitutes roleText with a single lookup.
+roleCommands = {}
+def reloadRoleSounds():
+    global roleCommands
+    result = {}
+    for roleName, sound in getRoleSoundsConfig().items():
+        if not sound:
+            continue
+        try:
+            role = Role[roleName]
+        except KeyError:
+            log.error(f"Unknown role in earcon frenzy role sounds: {roleName}")
+            continue
+        try:
+            result[role] = PpWaveFileCommand(getBuiltInSoundPath(sound))
+        except Exception as e:
+            log.error(f"Failed to load earcon frenzy role sound {sound}", e)
+    oldCommands = roleCommands
+    roleCommands = result
+    releaseCommands(oldCommands.values())
+
+# State name, or ROLE.STATE for role specific sounds, to (positive sound, negative sound).
+defaultStateSounds = {
+    "CHECKED": ("classic/on.wav", "classic/off.wav"),
+    "HALFCHECKED": ("classic/ellipses.wav", ""),
+    "PRESSED": ("classic/on.wav", "classic/off.wav"),
+    "EXPANDED": ("chimes/open-object.wav", ""),
+    "COLLAPSED": ("chimes/close-object.wav", ""),
+    "SELECTED": ("chimes/select-object.wav", "chimes/deselect-object.wav"),
+    "BUSY": ("chimes/progress.wav", ""),
+    "REQUIRED": ("chimes/mark-object.wav", ""),
+    "INVALID_ENTRY": ("chimes/warn-user.wav", ""),
+}
+
+def getStateSoundsConfig():
+    """
+    State sounds are configured as a JSON object in the same shape as defaultStateSounds, e.g.
+    {"CHECKED": ["chimes/on.wav", "chimes/off.wav"], "TREEVIEWITEM.EXPANDED": ["", ""]}
+    Empty sound means the state is spoken as usual.
+    """
+    result = dict(defaultStateSounds)
+    stateSoundsJson = config.conf[pp]["stateSounds"]
+    if stateSoundsJson:
+        try:
+            result.update(json.loads(stateSoundsJson))
+        except ValueError as e:
+            log.error("Invalid earcon frenzy state sounds configuration", e)
+    return result
+
+# None key holds sounds for all roles, role keys hold role specific overrides.
+# Values are pairs of {State: command} dicts for positive and negative states.
+stateCommands = {}
+# Immutable merged label dicts per (role, enabled), built on first use.
+stateLabelDictsCache = {}
+emptyStateLabelDict = types.MappingProxyType({})
+
+def reloadStateSounds():
+    global stateCommands, stateLabelDictsCache
+    result = {}
+    commandCache = {}
+    for key, sounds in getStateSoundsConfig().items():
+        roleName, _sep, stateName = key.rpartition(".")
+        try:
+            role = Role[roleName] if roleName else None
+            state = State[stateName]
+        except KeyError:
+            log.error(f"Unknown role or state in earcon frenzy state sounds: {key}")
+            continue
+        positive, negative = result.setdefault(role, ({}, {}))
+        for labelDict, sound in zip((positive, negative), sounds):
+            if not sound:
+                labelDict[state] = None
+                continue
+            try:
+                if sound not in commandCache:
+                    commandCache[sound] = PpWaveFileCommand(getBuiltInSoundPath(sound))
+                labelDict[state] = commandCache[sound]
+            except Exception as e:
+                log.error(f"Failed to load earcon frenzy state sound {sound}", e)
+    oldCommands = stateCommands
+    stateCommands = result
+    stateLabelDictsCache = {}
+    releaseCommands(
+        command
+        for labelDicts in oldCommands.values()
+        for labelDict in labelDicts
+        for command in labelDict.values()
+        if command is not None
     )
 
+def getStateLabelDicts(role, enabled):
+    try:
+        return stateLabelDictsCache[(role, enabled)]
+    except KeyError:
+        pass
+    if enabled:
+        positive = {}
+        negative = {}
+        for key in (None, role):
+            commands = stateCommands.get(key)
+            if commands is not None:
+                positive.update(commands[0])
+                negative.update(commands[1])
+        # None marks a state disabled for this role.
+        result = (
+            types.MappingProxyType({k:v for k,v in positive.items() if v is not None}),
+            types.MappingProxyType({k:v for k,v in negative.items() if v is not None}),
+        )
+    else:
+        result = (emptyStateLabelDict, emptyStateLabelDict)
+    stateLabelDictsCache[(role, enabled)] = result
+    return result
+
 audioRuleBuiltInWave = "builtInWave"
 audioRuleWave = "wave"
 audioRuleBeep = "beep"
@@ -342,6 +1690,7 @@ class AudioRule:
         self.prosodyOffset = prosodyOffset
         self.prosodyMultiplier = prosodyMultiplier
         self.volume = volume
+        self.budgetViolations = 0
         self.regexp = re.compile(self.pattern)
         self.speechCommand, self.postSpeechCommand = self.getSpeechCommand()
 
@@ -419,30 +1768,552 @@ class AudioRule:
             index = match.end(0)
         yield s[index:]
 
+def getFirstChars(items):
+    """
+    Approximates characters a parsed regex sequence can start with.
+    Returns (set of characters, whether it can start with a wide class of characters, whether it can match empty string).
+    """
+    chars = set()
+    wide = False
+    for op, av in items:
+        itemChars, itemWide, nullable = getItemFirstChars(op, av)
+        chars |= itemChars
+        wide = wide or itemWide
+        if not nullable:
+            return chars, wide, False
+    return chars, wide, True
+
+def getItemFirstChars(op, av):
+    if op == sre_constants.LITERAL:
+        return {chr(av)}, False, False
+    if op in (sre_constants.NOT_LITERAL, sre_constants.ANY):
+        return set(), True, False
+    if op == sre_constants.IN:
+        chars = set()
+        for itemOp, itemAv in av:
+            if itemOp == sre_constants.LITERAL:
+                chars.add(chr(itemAv))
+            elif itemOp == sre_constants.RANGE and itemAv[1] - itemAv[0] < 256:
+                chars.update(chr(c) for c in range(itemAv[0], itemAv[1] + 1))
+            else:
+                return chars, True, False
+        return chars, False, False
+    if op == sre_constants.SUBPATTERN:
+        return getFirstChars(av[-1])
+    if op == sre_constants.BRANCH:
+        chars = set()
+        wide = False
+        nullable = False
+        for branch in av[1]:
+            branchChars, branchWide, branchNullable = getFirstChars(branch)
+            chars |= branchChars
+            wide = wide or branchWide
+            nullable = nullable or branchNullable
+        return chars, wide, nullable
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+        chars, wide, nullable = getFirstChars(av[2])
+        return chars, wide, nullable or av[0] == 0
+    if op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return set(), False, True
+    # Anything else, e.g. group references, is treated as matching anything.
+    return set(), True, True
+
+def firstCharsOverlap(a, b):
+    aChars, aWide, _aNullable = a
+    bChars, bWide, _bNullable = b
+    if aWide:
+        return bWide or bool(bChars)
+    if bWide:
+        return bool(aChars)
+    return bool(aChars & bChars)
+
+def isVariableRepeat(op, av):
+    return op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[1] != av[0]
+
+def findBacktrackingRisks(pattern):
+    """
+    Static check for constructs prone to catastrophic backtracking:
+    a variable quantifier nested in another one, e.g. (a+)+,
+    and alternatives that can start with the same character inside a quantifier, e.g. (\\w|\\d\\d)+.
+    """
+    risks = []
+    def walk(items, insideRepeat):
+        for op, av in items:
+            if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+                if insideRepeat and isVariableRepeat(op, av):
+                    risks.append(_("Nested quantifiers, such as (a+)+"))
+                walk(av[2], insideRepeat or av[1] > 1)
+            elif op == sre_constants.BRANCH:
+                if insideRepeat:
+                    firsts = [getFirstChars(branch) for branch in av[1]]
+                    if any(
+                        firstCharsOverlap(a, b)
+                        for a, b in itertools.combinations(firsts, 2)
+                    ):
+                        risks.append(_("Repeated alternatives that can match the same text, such as (\\w|\\d\\d)+"))
+                for branch in av[1]:
+                    walk(branch, insideRepeat)
+            elif op == sre_constants.SUBPATTERN:
+                walk(av[-1], insideRepeat)
+            elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+                walk(av[1], insideRepeat)
+    walk(sre_parse.parse(pattern), False)
+    return list(collections.OrderedDict.fromkeys(risks))
+
+# Realistic text for timed trial matches of rule patterns.
+regexTrialCorpus = [
+    "Hello, world! This is a test: does it work? Yes; it does.",
+    "(555) 123-4567, $12.50 - 15% off... \"Quoted\" 'text' [brackets] {braces} <angle> a/b\\c",
+    "    indented    line\twith\ttabs   and trailing spaces    ",
+    "def getTextInfoSpeech(info, useCache=None, formatConfig=None): return None",
+    "https://example.com/path?query=value&other=1#fragment user@example.com",
+]
+# Seconds a single trial match may take before the pattern is reported as slow.
+regexTrialTimeLimit = 0.1
+regexTrialLengths = list(range(2, 41, 2)) + [64, 128, 256, 512, 1024, 2048, 4096]
+
+def timeRegexTrial(regexp):
+    """
+    Times regexp on sample text and on growing runs of characters that occur in its pattern.
+    Lengths grow in small steps, so that exponential backtracking is detected
+    long before a single trial takes much more than the time limit.
+    Returns worst time in seconds and description of the slowest input, or of the first input exceeding the limit.
+    """
+    worst = 0.0
+    worstInput = ""
+    def timeInput(text, description):
+        nonlocal worst, worstInput
+        startTime = time.perf_counter()
+        for _match in regexp.finditer(text):
+            pass
+        elapsed = time.perf_counter() - startTime
+        if elapsed > worst:
+            worst = elapsed
+            worstInput = description
+        return elapsed <= regexTrialTimeLimit
+    for text in regexTrialCorpus:
+        if not timeInput(text, _("sample text")):
+            return worst, worstInput
+    runChars = [c for c in regexp.pattern if c.isprintable() and c not in "\\()[]{}|?*+^$"]
+    runChars = list(collections.OrderedDict.fromkeys(runChars + list("a 1.")))[:8]
+    for c in runChars:
+        for n in regexTrialLengths:
+            # Trailing control character rarely matches and forces backtracking.
+            if not timeInput(c * n + "\x00", _("{n} repeated {c!r}").format(n=n, c=c)):
+                return worst, worstInput
+    return worst, worstInput
+
+def disableSlowRules(newRules):
+    """
+    Runs the pattern checks of validateRule on rules that didn't go through the rules dialog,
+    i.e. rules read from the rules file or imported from a rule pack.
+    A rule is disabled when its timed trial exceeds regexTrialTimeLimit;
+    static risks alone only warn, as in the dialog, where the user may save such a rule anyway.
+    Returns number of rules disabled.
+    """
+    disabled = 0
+    for rule in newRules:
+        if not rule.enabled:
+            continue
+        trialSeconds, trialInput = timeRegexTrial(rule.regexp)
+        if trialSeconds <= regexTrialTimeLimit:
+            continue
+        rule.enabled = False
+        disabled += 1
+        risks = findBacktrackingRisks(rule.pattern)
+        log.warning(
+            f"Earcon frenzy rule {rule.getDisplayName()!r} has been disabled: "
+            f"matching {trialInput} took {trialSeconds * 1000:.0f} ms. "
+            + " ".join(risks)
+        )
+    return disabled
+
+RuleValidationResult = collections.namedtuple("RuleValidationResult", "rule error errorField warnings trialSeconds")
+
+def validateRule(ruleKwargs):
+    """
+    Checks and builds an audio rule. This compiles the pattern, runs regex checks and decodes wave files,
+    so it is run on a worker thread by the rule dialog.
+    errorField is the dialog control attribute to focus when there is an error.
+    """
+    def failure(error, errorField="patternTextCtrl"):
+        return RuleValidationResult(None, error, errorField, [], None)
+    pattern = ruleKwargs["pattern"]
+    try:
+        regexp = re.compile(pattern)
+    except re.error:
+        # Translators: Invalid regular expression
+        return failure(_("Invalid regular expression."))
+    if ruleKwargs["ruleType"] == audioRuleWave:
+        wavFile = ruleKwargs["wavFile"]
+        if not wavFile or not os.path.exists(wavFile):
+            # Translators: wav file not found
+            return failure(_("Wav file not found."), "wavName")
+        try:
+            wave.open(wavFile, "r").close()
+        except (wave.Error, EOFError):
+            # Translators: Invalid wav file
+            return failure(_("Invalid wav file."), "wavName")
+    risks = findBacktrackingRisks(pattern)
+    trialSeconds, trialInput = timeRegexTrial(regexp)
+    if trialSeconds > regexTrialTimeLimit:
+        risks.append(_("Matching {input} took {ms:.0f} ms").format(input=trialInput, ms=trialSeconds * 1000))
+    try:
+        rule = AudioRule(**ruleKwargs)
+        if isinstance(rule.speechCommand, PpWaveFileCommand):
+            rule.speechCommand.prepare()
+    except Exception as e:
+        log.error("Could not add Audio Rule", e)
+        # Translators: This is an error message to let the user know that the Audio rule is not valid.
+        return failure(_("Error creating audio rule: {error}").format(error=e), None)
+    return RuleValidationResult(rule, None, None, risks, trialSeconds)
+
+
+captureFormat = "earconFrenzyCapture"
+captureFormatVersion = 1
+soundsPathPrefix = "$sounds/"
+
+def encodeCaptureValue(value):
+    """
+    Structural, JSON-compatible encoding of fields and speech sequences for capture files.
+    Special values are encoded as single-key dicts with a key starting with "$".
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, enum.Enum):
+        return {"$enum": [type(value).__name__, value.name]}
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [encodeCaptureValue(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {"$set": sorted((encodeCaptureValue(v) for v in value), key=repr)}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: encodeCaptureValue(v) for k, v in value.items()}
+        return {"$items": [[encodeCaptureValue(k), encodeCaptureValue(v)] for k, v in value.items()]}
+    if isinstance(value, textInfos.FieldCommand):
+        return {"$field": [value.command, encodeCaptureValue(value.field)]}
+    if isinstance(value, speech.commands.SpeechCommand):
+        return {"$command": [type(value).__name__, encodeSpeechCommandAttributes(value)]}
+    return {"$repr": repr(value)}
+
+def encodeSpeechCommandAttributes(command):
+    names = getattr(command, "captureFields", None)
+    if names is None:
+        # Plain NVDA commands: keep only simple public attributes.
+        names = [
+            k for k,v in getattr(command, "__dict__", {}).items()
+            if not k.startswith("_")
+            and (v is None or isinstance(v, (bool, int, float, str, enum.Enum)))
+        ]
+    # Fields added after captures were first recorded are left out at their default value,
+    # so that older captures still match.
+    defaults = getattr(command, "captureDefaults", {})
+    result = {}
+    for name in names:
+        value = getattr(command, name)
+        if name in defaults and value == defaults[name]:
+            continue
+        if name == "fileName" and isinstance(value, str):
+            soundsPath = getSoundsPath()
+            if os.path.normcase(value).startswith(os.path.normcase(soundsPath + os.sep)):
+                value = soundsPathPrefix + "/".join(value[len(soundsPath) + 1:].split(os.sep))
+        result[name] = encodeCaptureValue(value)
+    return result
+
+class CaptureRecorder:
+    """
+    Writes captured textInfo calls and speech sequences to a gzipped JSON lines file.
+    The first line is a header carrying format name and version.
+    """
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.file = gzip.open(fileName, "wt", encoding="utf-8")
+        self.lock = threading.Lock()
+        self.count = 0
+        self._writeLine({
+            "format": captureFormat,
+            "version": captureFormatVersion,
+            "frenzyStateFields": list(FrenzyState.fieldNames),
+        })
+
+    def _writeLine(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line + "\n")
+
+    def write(self, record):
+        self._writeLine(record)
+        self.count += 1
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+            self.file = None
+
+captureRecorder = None
+def startCapture():
+    global captureRecorder
+    fileName = os.path.join(globalVars.appArgs.configPath, time.strftime("earconFrenzyCapture-%Y%m%d-%H%M%S.jsonl.gz"))
+    captureRecorder = CaptureRecorder(fileName)
+    return fileName
+
+def stopCapture():
+    global captureRecorder
+    recorder = captureRecorder
+    captureRecorder = None
+    if recorder is not None:
+        recorder.close()
+    return recorder
 
 rulesDialogOpen = False
 rules = []
 rulesFileName = os.path.join(globalVars.appArgs.configPath, "earconFrenzyRules.json")
-def reloadRules():
-    global rules
+traceFileName = os.path.join(globalVars.appArgs.configPath, "earconFrenzyTrace.txt")
+latencyFileName = os.path.join(globalVars.appArgs.configPath, "earconFrenzyLatency.json")
+# Rule sets are built in two phases and then published with a single assignment,
+# so speech never sees a partly built rule set. rulesGeneration discards builds overtaken by newer ones.
+rulesLock = threading.Lock()
+rulesGeneration = 0
+ruleBuildWorkers = max(1, min(8, os.cpu_count() or 1))
+
+def readRulesConfig():
     try:
         rulesConfig = open(rulesFileName, "r").read()
     except FileNotFoundError:
         rulesConfig = defaultRules
-    mylog("Loading rules:")
+    trace(TRACE_INFO, "Loading rules:")
     if len(rulesConfig) == 0:
-        mylog("No rules config found, using default one.")
+        trace(TRACE_INFO, "No rules config found, using default one.")
         rulesConfig = defaultRules
-    mylog(rulesConfig)
-    rules = []
+    trace(TRACE_DEBUG, "%s", rulesConfig)
+    return rulesConfig
+
+def parseRules(rulesConfig):
+    """
+    Parse phase: compiles patterns and creates commands without reading any sound.
+    Rules with slow patterns are disabled.
+    """
+    result = []
     for ruleDict in json.loads(rulesConfig):
         try:
-            rules.append(AudioRule(**ruleDict))
+            result.append(AudioRule(**ruleDict))
         except Exception as e:
             log.error("Failed to load audio rule", e)
+    disableSlowRules(result)
+    return result
+
+def prepareCommands(commands):
+    for command in commands:
+        command.tryPrepare()
+
+def buildRules(newRules):
+    """
+    Build phase: decodes sounds and prepares wave commands of rules on worker threads.
+    Commands are grouped by file, so that each file is decoded once.
+    """
+    commandsByFile = collections.OrderedDict()
+    for command in getRuleCommands(newRules):
+        if isinstance(command, PpWaveFileCommand):
+            commandsByFile.setdefault(command.fileName, []).append(command)
+    workers = min(ruleBuildWorkers, len(commandsByFile))
+    if workers <= 1:
+        for commands in commandsByFile.values():
+            prepareCommands(commands)
+        return
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(prepareCommands, commandsByFile.values()))
+
+def publishRules(newRules, generation=None):
+    """
+    Makes newRules the active rule set and releases commands of the old one.
+    With generation, newRules are dropped if another rule set was published or requested since.
+    Returns the rule set that is no longer used.
+    """
+    global rules, rulesGeneration
+    with rulesLock:
+        if generation is None:
+            rulesGeneration += 1
+        elif generation != rulesGeneration:
+            releaseCommands(getRuleCommands(newRules), getRuleCommands(rules))
+            return newRules
+        oldRules = rules
+        rules = newRules
+    releaseCommands(getRuleCommands(oldRules), getRuleCommands(newRules))
+    return oldRules
+
+def reloadRules(background=False):
+    """
+    Loads rules from rulesFileName.
+    In background the calling thread returns immediately and current rules stay active until new ones are built.
+    """
+    global rulesGeneration
+    with rulesLock:
+        rulesGeneration += 1
+        generation = rulesGeneration
+    def build():
+        startTime = time.perf_counter()
+        newRules = parseRules(readRulesConfig())
+        parseTime = time.perf_counter()
+        buildRules(newRules)
+        publishRules(newRules, generation)
+        trace(
+            TRACE_INFO, "Built %d rules: parse %.1f ms, build %.1f ms",
+            len(newRules), (parseTime - startTime) * 1000, (time.perf_counter() - parseTime) * 1000,
+        )
+    if not background:
+        build()
+        return
+    def threadFunc():
+        try:
+            build()
+        except Exception as e:
+            log.error("Error while reloading earcon frenzy rules", e)
+    Thread(target=threadFunc, daemon=True).start()
+
+def loadRulePack(fileName):
+    """
+    Returns rules from a JSON file in the same format as the rules file, number of rules that failed to load,
+    and number of rules disabled because their pattern is slow.
+    """
+    with open(fileName, "r", encoding="utf-8") as f:
+        ruleDicts = json.load(f)
+    result = []
+    failed = 0
+    for ruleDict in ruleDicts:
+        try:
+            result.append(AudioRule(**ruleDict))
+        except Exception as e:
+            log.error("Failed to load audio rule", e)
+            failed += 1
+    return result, failed, disableSlowRules(result)
+
+def saveRulePack(fileName, rulesToSave):
+    rulesJson = json.dumps([rule.asDict() for rule in rulesToSave], indent=4, sort_keys=True)
+    with open(fileName, "w", encoding="utf-8") as f:
+        f.write(rulesJson)
+
+class RulesModel:
+    """
+    Rules being edited in the rules dialog, with cached display rows and a filter.
+    Positions refer to rows currently shown; indices refer to rules.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.rows = [self.makeRow(rule) for rule in self.rules]
+        self.filterText = ""
+        self.visible = list(range(len(self.rules)))
+        self.modified = False
+        # Rules replaced or removed while editing, their commands are released when the dialog closes.
+        self.discarded = []
+
+    @staticmethod
+    def makeRow(rule):
+        return (
+            rule.getDisplayName(),
+            _("Enabled") if rule.enabled else _("Disabled"),
+            rule.ruleType,
+            rule.getReplacementDescription(),
+        )
 
+    def matches(self, index, text):
+        return any(text in column.lower() for column in self.rows[index])
 
+    def setFilter(self, text):
+        text = text.strip().lower()
+        if text.startswith(self.filterText):
+            # Narrowing the filter only needs to look at rows shown already
+            candidates = self.visible
+        else:
+            candidates = range(len(self.rules))
+        self.filterText = text
+        self.visible = [i for i in candidates if self.matches(i, text)]
+
+    def refilter(self):
+        text = self.filterText
+        self.filterText = ""
+        self.setFilter(text)
+
+    def __len__(self):
+        return len(self.visible)
+
+    def getRow(self, position):
+        return self.rows[self.visible[position]]
+
+    def getRule(self, position):
+        return self.rules[self.visible[position]]
+
+    def updateRow(self, index):
+        self.rows[index] = self.makeRow(self.rules[index])
+        self.modified = True
+
+    def add(self, newRules):
+        """ Appends rules and returns their positions. Added rules are shown regardless of the filter. """
+        start = len(self.rules)
+        self.rules.extend(newRules)
+        self.rows.extend(self.makeRow(rule) for rule in newRules)
+        self.visible.extend(range(start, len(self.rules)))
+        self.modified = True
+        return list(range(len(self.visible) - len(newRules), len(self.visible)))
+
+    def replace(self, position, rule):
+        index = self.visible[position]
+        self.discarded.append(self.rules[index])
+        self.rules[index] = rule
+        self.updateRow(index)
+
+    def setEnabled(self, positions, enabled):
+        for position in positions:
+            index = self.visible[position]
+            self.rules[index].enabled = enabled
+            self.updateRow(index)
+
+    def remove(self, positions):
+        removed = {self.visible[position] for position in positions}
+        if not removed:
+            return
+        self.discarded.extend(self.rules[i] for i in sorted(removed))
+        self.rules = [rule for i, rule in enumerate(self.rules) if i not in removed]
+        self.rows = [row for i, row in enumerate(self.rows) if i not in removed]
+        # Shift indices of remaining rules down past removed ones
+        removedSorted = sorted(removed)
+        self.visible = [
+            i - bisect.bisect_left(removedSorted, i)
+            for i in self.visible
+            if i not in removed
+        ]
+        self.modified = True
+
+    def move(self, positions, increment):
+        """
+        Moves selected rows as a block by one shown row up or down and returns their new positions.
+        When filtered, rules swap places with the neighbouring shown rule.
+        """
+        positions = sorted(positions, reverse=increment > 0)
+        if not positions:
+            return positions
+        edge = positions[0] + increment
+        if not (0 <= edge < len(self.visible)):
+            return positions
+        for position in positions:
+            a = self.visible[position]
+            b = self.visible[position + increment]
+            self.rules[a], self.rules[b] = self.rules[b], self.rules[a]
+            self.rows[a], self.rows[b] = self.rows[b], self.rows[a]
+        self.modified = True
+        return sorted(position + increment for position in positions)
+
+
+startTime = time.perf_counter()
 initConfiguration()
+applyTraceConfiguration()
+recordStartup("configuration", startTime)
+startTime = time.perf_counter()
+reloadRoleSounds()
+reloadStateSounds()
+recordStartup("roleAndStateSounds", startTime)
 #reloadRules()
 addonHandler.initTranslation()
 
@@ -463,6 +2334,8 @@ class AudioRuleDialog(wx.Dialog):
 
     def __init__(self, parent, title=_("Edit audio rule")):
         self.lastTestTime = 0
+        self.validationGeneration = 0
+        self.testRule = None
         super(AudioRuleDialog,self).__init__(parent,title=title)
         mainSizer=wx.BoxSizer(wx.VERTICAL)
         sHelper = guiHelper.BoxSizerHelper(self, orientation=wx.VERTICAL)
@@ -493,6 +2366,8 @@ class AudioRuleDialog(wx.Dialog):
             audioRuleProsody: [],
         }
 
+        self.soundCatalog = getSoundCatalog()
+        self.biwShown = []
       # Translators: built in wav category  combo box
         biwCategoryLabelText=_("&Category:")
         self.biwCategory=guiHelper.LabeledControlHelper(
@@ -515,6 +2390,10 @@ class AudioRuleDialog(wx.Dialog):
 
         self.biwList.control.Bind(wx.EVT_CHOICE,self.onBiw)
         self.typeControls[audioRuleBuiltInWave].append(self.biwList.control)
+      # Translators: edit box to search built in wav files in all categories
+        self.biwFilter = sHelper.addLabeledControl(_("&Search waves:"), wx.TextCtrl)
+        self.biwFilter.Bind(wx.EVT_TEXT, self.onBiwCategory)
+        self.typeControls[audioRuleBuiltInWave].append(self.biwFilter)
       # Translators: wav file edit box
         self.wavName  = sHelper.addLabeledControl(_("Wav file"), wx.TextCtrl)
         #self.wavName.Disable()
@@ -576,6 +2455,7 @@ class AudioRuleDialog(wx.Dialog):
       # Translators: This is the button to test audio rule
         self.testButton = sHelper.addItem (wx.Button (self, label = _("&Test, press twice for repeated sound")))
         self.testButton.Bind(wx.EVT_BUTTON, self.onTestClick)
+        self.statusText = sHelper.addItem(wx.StaticText(self, label=""))
 
         sHelper.addDialogDismissButtons(self.CreateButtonSizer(wx.OK|wx.CANCEL))
 
@@ -622,33 +2502,16 @@ class AudioRuleDialog(wx.Dialog):
         #self.caseSensitiveCheckBox.SetValue(rule.caseSensitive)
         self.onType(None)
 
-    def makeRule(self):
+    def getRuleFields(self):
+        """
+        Checks fields that are cheap to check and returns arguments of AudioRule.
+        Pattern, wave file and the rule itself are checked by validateRule on a worker thread.
+        """
         if not self.patternTextCtrl.GetValue():
             # Translators: This is an error message to let the user know that the pattern field is not valid.
             gui.messageBox(_("A pattern is required."), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
             self.patternTextCtrl.SetFocus()
             return
-        try:
-            re.compile(self.patternTextCtrl.GetValue())
-        except sre_constants.error:
-            # Translators: Invalid regular expression
-            gui.messageBox(_("Invalid regular expression."), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
-            self.patternTextCtrl.SetFocus()
-            return
-
-        if self.getType() == audioRuleWave:
-            if not self.wavName.GetValue() or not os.path.exists(self.wavName.GetValue()):
-                # Translators: wav file not found
-                gui.messageBox(_("Wav file not found."), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
-                self.wavName.SetFocus()
-                return
-            try:
-                wave.open(self.wavName.GetValue(), "r").close()
-            except wave.Error:
-                # Translators: Invalid wav file
-                gui.messageBox(_("Invalid wav file."), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
-                self.wavName.SetFocus()
-                return
         try:
             self.getInt(self.startAdjustmentTextCtrl.GetValue())
         except ValueError:
@@ -687,6 +2550,14 @@ class AudioRuleDialog(wx.Dialog):
                 gui.messageBox(_("duration must be an integer between 0 and 60000"), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
                 self.durationTextCtrl.SetFocus()
                 return
+        builtInWavFile = None
+        if self.getType() == audioRuleBuiltInWave:
+            builtInWavFile = self.getBiw()
+            if builtInWavFile is None:
+                # Translators: error shown when no built in sound is selected
+                gui.messageBox(_("You must choose a built in sound."), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
+                self.biwList.control.SetFocus()
+                return
         prosodyOffset = None
         prosodyMultiplier = None
         if self.getType() == audioRuleProsody:
@@ -728,42 +2599,87 @@ class AudioRuleDialog(wx.Dialog):
                 gui.messageBox(_("You must specify either prosody offset or multiplier."), _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
                 self.prosodyOffsetTextCtrl.SetFocus()
                 return
-            mylog(f"prosodyOffset={prosodyOffset}")
-            mylog(f"prosodyMultiplier={prosodyMultiplier}")
+            trace(TRACE_DEBUG, "prosodyOffset=%s prosodyMultiplier=%s", prosodyOffset, prosodyMultiplier)
+
+        return dict(
+            comment=self.commentTextCtrl.GetValue(),
+            pattern=self.patternTextCtrl.GetValue(),
+            ruleType=self.getType(),
+            wavFile=self.wavName.GetValue(),
+            builtInWavFile=builtInWavFile,
+            startAdjustment=self.getInt(self.startAdjustmentTextCtrl.GetValue()) or 0,
+            endAdjustment=self.getInt(self.endAdjustmentTextCtrl.GetValue()) or 0,
+            tone=self.getInt(self.toneTextCtrl.GetValue()),
+            duration=self.getInt(self.durationTextCtrl.GetValue()),
+            enabled=bool(self.enabledCheckBox.GetValue()),
+            prosodyName=self.PROSODY_LABELS[self.prosodyNameCategory.control.GetSelection()],
+            prosodyOffset=prosodyOffset,
+            prosodyMultiplier=prosodyMultiplier,
+            volume=self.volumeSlider.Value or 100,
+        )
 
-        try:
-            return AudioRule(
-                comment=self.commentTextCtrl.GetValue(),
-                pattern=self.patternTextCtrl.GetValue(),
-                ruleType=self.getType(),
-                wavFile=self.wavName.GetValue(),
-                builtInWavFile=self.getBiw(),
-                startAdjustment=self.getInt(self.startAdjustmentTextCtrl.GetValue()) or 0,
-                endAdjustment=self.getInt(self.endAdjustmentTextCtrl.GetValue()) or 0,
-                tone=self.getInt(self.toneTextCtrl.GetValue()),
-                duration=self.getInt(self.durationTextCtrl.GetValue()),
-                enabled=bool(self.enabledCheckBox.GetValue()),
-                prosodyName=self.PROSODY_LABELS[self.prosodyNameCategory.control.GetSelection()],
-                prosodyOffset=prosodyOffset,
-                prosodyMultiplier=prosodyMultiplier,
-                volume=self.volumeSlider.Value or 100,
-            )
-        except Exception as e:
-            log.error("Could not add Audio Rule", e)
-            # Translators: This is an error message to let the user know that the Audio rule is not valid.
-            gui.messageBox(
-                _(f"Error creating audio rule: {e}"),
-                _("Audio rule Error"),
-                wx.OK|wx.ICON_WARNING, self
-            )
+    def startValidation(self, ruleFields, onSuccess):
+        self.validationGeneration += 1
+        generation = self.validationGeneration
+        self.setValidating(True)
+        def threadFunc():
+            try:
+                result = validateRule(ruleFields)
+            except Exception as e:
+                log.error("Error validating earcon frenzy audio rule", e)
+                result = RuleValidationResult(None, _("Error creating audio rule: {error}").format(error=e), None, [], None)
+            wx.CallAfter(self.onValidationDone, generation, result, onSuccess)
+        Thread(target=threadFunc, daemon=True).start()
+        def announce():
+            if self and generation == self.validationGeneration and not self.okButton.IsEnabled():
+                ui.message(_("Validating rule"))
+        core.callLater(500, announce)
+
+    def setValidating(self, validating):
+        self.okButton.Enable(not validating)
+        self.testButton.Enable(not validating)
+        if validating:
+            self.statusText.SetLabel(_("Validating rule..."))
+
+    def onValidationDone(self, generation, result, onSuccess):
+        if not self or generation != self.validationGeneration:
+            # Dialog closed or another validation started meanwhile
+            if result.rule is not None:
+                releaseCommands(getRuleCommands([result.rule]))
+            return
+        self.setValidating(False)
+        if result.error is not None:
+            self.statusText.SetLabel(result.error)
+            gui.messageBox(result.error, _("Dictionary Entry Error"), wx.OK|wx.ICON_WARNING, self)
+            if result.errorField is not None:
+                getattr(self, result.errorField).SetFocus()
             return
+        if result.warnings:
+            self.statusText.SetLabel(_("Pattern may be slow: {warnings}").format(warnings="; ".join(result.warnings)))
+        else:
+            self.statusText.SetLabel(_("Rule is valid, slowest trial match took {ms:.1f} ms").format(ms=result.trialSeconds * 1000))
+        onSuccess(result)
 
+    @property
+    def okButton(self):
+        return self.FindWindowById(wx.ID_OK, self)
 
     def onOk(self,evt):
-        rule = self.makeRule()
-        if rule is not None:
-            self.rule = rule
-            evt.Skip()
+        ruleFields = self.getRuleFields()
+        if ruleFields is not None:
+            # The dialog is closed once the rule is validated.
+            self.startValidation(ruleFields, self.onOkValidated)
+
+    def onOkValidated(self, result):
+        if result.warnings:
+            # Translators: confirmation to save a rule whose pattern may be slow
+            msg = _("This pattern may be slow to match:\n{warnings}\nSave it anyway?").format(warnings="\n".join(result.warnings))
+            if gui.messageBox(msg, _("Slow pattern"), wx.YES_NO|wx.ICON_WARNING, self) != wx.YES:
+                releaseCommands(getRuleCommands([result.rule]))
+                self.patternTextCtrl.SetFocus()
+                return
+        self.rule = result.rule
+        self.EndModal(wx.ID_OK)
 
     def _onBrowseClick(self, evt):
         p= 'c:'
@@ -779,21 +2695,25 @@ class AudioRuleDialog(wx.Dialog):
             break
 
     def onTestClick(self, evt):
-        global rulesDialogOpen
         if time.time() - self.lastTestTime < 1:
             # Button pressed twice within a second
             repeat = True
         else:
             repeat = False
         self.lastTestTime = time.time()
+        ruleFields = self.getRuleFields()
+        if ruleFields is not None:
+            self.startValidation(ruleFields, lambda result: self.playTest(result.rule, repeat))
+
+    def playTest(self, rule, repeat):
+        global rulesDialogOpen
         rulesDialogOpen = False
         try:
-            rule = self.makeRule()
-            if rule is None:
-                return
             preText = _("Hello")
             postText = _("world")
-            preCommand, postCommand = rule.getSpeechCommand()
+            self.releaseTestRule()
+            self.testRule = rule
+            preCommand, postCommand = rule.speechCommand, rule.postSpeechCommand
             if postCommand is not None:
                 utterance = [preText, preCommand, postText, postCommand]
             elif not repeat:
@@ -805,60 +2725,67 @@ class AudioRuleDialog(wx.Dialog):
         finally:
             rulesDialogOpen = True
 
+    def releaseTestRule(self):
+        if self.testRule is not None:
+            releaseCommands(getRuleCommands([self.testRule]))
+            self.testRule = None
+
     def getBiwCategories(self):
-        soundsPath = getSoundsPath()
-        return [o for o in os.listdir(soundsPath)
-            if os.path.isdir(os.path.join(soundsPath,o))
-        ]
+        return self.soundCatalog.categories()
 
     def getBuiltInWaveFilesInCategory(self):
-        soundsPath = getSoundsPath()
-        category = self.getBiwCategory()
-        ext = ".wav"
-        return [o for o in os.listdir(os.path.join(soundsPath, category))
-            if not os.path.isdir(os.path.join(soundsPath,o))
-                and o.lower().endswith(ext)
-        ]
+        return self.soundCatalog.soundsInCategory(self.getBiwCategory())
 
     def getBuiltInWaveFiles(self):
-        soundsPath = getSoundsPath()
-        result = []
-        for dirName, subdirList, fileList in os.walk(soundsPath, topdown=True):
-            relDirName = dirName[len(soundsPath):]
-            if len(relDirName) > 0 and relDirName[0] == "\\":
-                relDirName = relDirName[1:]
-            for fileName in fileList:
-                if fileName.lower().endswith(".wav"):
-                    result.append(os.path.join(relDirName, fileName))
-        return result
+        return [os.path.join(info.category, info.fileName) for info in self.soundCatalog.sounds]
+
+    def getBiwLabel(self, info, showCategory):
+        name = info.name if showCategory else info.fileName
+        # Translators: built in wav file with its duration in seconds
+        return _("{name} ({duration:.2f} s)").format(name=name, duration=info.duration)
 
     def getBiw(self):
-        return os.path.join(
-            self.getBiwCategory(),
-            self.getBuiltInWaveFilesInCategory()[self.biwList.control.GetSelection()]
-        )
+        index = self.biwList.control.GetSelection()
+        if not (0 <= index < len(self.biwShown)):
+            return None
+        info = self.biwShown[index]
+        return os.path.join(info.category, info.fileName)
 
     def setBiw(self, biw):
-        category, biwFile = os.path.split(biw)
-        categoryIndex = self.getBiwCategories().index(category)
+        self.biwFilter.ChangeValue("")
+        info = self.soundCatalog.get(biw)
+        if info is None:
+            return
+        categoryIndex = self.getBiwCategories().index(info.category)
         self.biwCategory.control.SetSelection(categoryIndex)
         self.onBiwCategory(None)
-        biwIndex = self.getBuiltInWaveFilesInCategory().index(biwFile)
-        self.biwList.control.SetSelection(biwIndex)
+        self.biwList.control.SetSelection(self.biwShown.index(info))
 
     def onBiw(self, evt):
         soundsPath = getSoundsPath()
-        biw = self.getBiw()
-        fullPath = os.path.join(soundsPath, biw)
-        nvwave.playWaveFile(fullPath)
+        index = self.biwList.control.GetSelection()
+        if not (0 <= index < len(self.biwShown)):
+            return
+        getPath = lambda info: os.path.join(soundsPath, info.category, info.fileName)
+        neighbours = [
+            getPath(self.biwShown[i])
+            for i in (index + 1, index - 1)
+            if 0 <= i < len(self.biwShown)
+        ]
+        soundPreviewer.play(getPath(self.biwShown[index]), prefetch=neighbours)
 
     def getBiwCategory(self):
         return   self.getBiwCategories()[self.biwCategory.control.GetSelection()]
 
     def onBiwCategory(self, evt):
-        soundsPath = getSoundsPath()
-        category = self.getBiwCategory()
-        self.biwList.control.SetItems(self.getBuiltInWaveFilesInCategory())
+        searchText = self.biwFilter.GetValue().strip()
+        if searchText:
+            self.biwShown = self.soundCatalog.search(searchText)
+        else:
+            self.biwShown = self.getBuiltInWaveFilesInCategory()
+        self.biwList.control.SetItems([self.getBiwLabel(info, bool(searchText)) for info in self.biwShown])
+        if self.biwShown:
+            self.biwList.control.SetSelection(0)
 
     def onType(self, evt):
         [control.Disable() for (t,controls) in self.typeControls.items() for control in controls]
@@ -873,9 +2800,12 @@ class RulesDialog(SettingsPanel):
         global rulesDialogOpen
         rulesDialogOpen = True
         reloadRules()
-        self.rules = rules[:]
+        self.model = RulesModel(rules)
 
         sHelper = gui.guiHelper.BoxSizerHelper(self, sizer=settingsSizer)
+      # Translators: edit box to filter rules
+        self.filterEdit = sHelper.addLabeledControl(_("&Filter:"), wx.TextCtrl)
+        self.filterEdit.Bind(wx.EVT_TEXT, self.onFilterChange)
       # Rules table
         rulesText = _("&Rules")
         self.rulesList = sHelper.addLabeledControl(
@@ -883,7 +2813,7 @@ class RulesDialog(SettingsPanel):
             nvdaControls.AutoWidthColumnListCtrl,
             autoSizeColumn=2,
             itemTextCallable=self.getItemTextForList,
-            style=wx.LC_REPORT | wx.LC_SINGLE_SEL | wx.LC_VIRTUAL
+            style=wx.LC_REPORT | wx.LC_VIRTUAL
         )
 
         # Translators: The label for a column in symbols list used to identify a symbol.
@@ -892,7 +2822,7 @@ class RulesDialog(SettingsPanel):
         self.rulesList.InsertColumn(2, _("Type"))
         self.rulesList.InsertColumn(3, _("Effect"))
         self.rulesList.Bind(wx.EVT_LIST_ITEM_FOCUSED, self.onListItemFocused)
-        self.rulesList.ItemCount = len(self.rules)
+        self.rulesList.ItemCount = len(self.model)
       # Buttons
         bHelper = sHelper.addItem(guiHelper.ButtonHelper(orientation=wx.HORIZONTAL))
         self.toggleButton = bHelper.addButton(self, label=_("Toggle"))
@@ -907,58 +2837,79 @@ class RulesDialog(SettingsPanel):
         self.editButton.Bind(wx.EVT_BUTTON, self.OnEditClick)
         self.removeButton = bHelper.addButton(self, label=_("Re&move rule"))
         self.removeButton.Bind(wx.EVT_BUTTON, self.OnRemoveClick)
+        bHelper = sHelper.addItem(guiHelper.ButtonHelper(orientation=wx.HORIZONTAL))
+        self.importButton = bHelper.addButton(self, label=_("&Import rules..."))
+        self.importButton.Bind(wx.EVT_BUTTON, self.OnImportClick)
+        self.exportButton = bHelper.addButton(self, label=_("E&xport rules..."))
+        self.exportButton.Bind(wx.EVT_BUTTON, self.OnExportClick)
 
 
     def postInit(self):
         self.rulesList.SetFocus()
 
     def getItemTextForList(self, item, column):
-        rule = self.rules[item]
-        if column == 0:
-            return rule.getDisplayName()
-        elif column == 1:
-            return _("Enabled") if rule.enabled else _("Disabled")
-        elif column == 2:
-            return rule.ruleType
-        elif column == 3:
-            return rule.getReplacementDescription()
-        else:
-            raise ValueError("Unknown column: %d" % column)
+        return self.model.getRow(item)[column]
+
+    def getSelectedPositions(self):
+        result = []
+        index=self.rulesList.GetFirstSelected()
+        while index>=0:
+            result.append(index)
+            index=self.rulesList.GetNextSelected(index)
+        return result
+
+    def updateList(self, selection=()):
+        self.rulesList.ItemCount = len(self.model)
+        for index in self.getSelectedPositions():
+            self.rulesList.Select(index, on=0)
+        for index in selection:
+            self.rulesList.Select(index)
+        if selection:
+            self.rulesList.Focus(selection[0])
+            # We don't get a new focus event with the new index.
+            self.rulesList.sendListItemFocusedEvent(selection[0])
+        self.rulesList.Refresh()
+
+    def onFilterChange(self, evt):
+        self.model.setFilter(self.filterEdit.GetValue())
+        self.updateList()
 
     def onListItemFocused(self, evt):
-        if self.rulesList.GetSelectedItemCount()!=1:
+        positions = self.getSelectedPositions()
+        if not positions:
             return
-        index=self.rulesList.GetFirstSelected()
-        rule = self.rules[index]
-        if rule.enabled:
+        if all(self.model.getRule(position).enabled for position in positions):
             self.toggleButton.SetLabel(_("Disable (&toggle)"))
         else:
             self.toggleButton.SetLabel(_("Enable (&toggle)"))
 
     def onToggleClick(self,evt):
-        if self.rulesList.GetSelectedItemCount()!=1:
+        positions = self.getSelectedPositions()
+        if not positions:
             return
-        index=self.rulesList.GetFirstSelected()
-        self.rules[index].enabled = not self.rules[index].enabled
-        if self.rules[index].enabled:
+        # Mixed selection is enabled first, just like a single disabled rule
+        enabled = not all(self.model.getRule(position).enabled for position in positions)
+        self.model.setEnabled(positions, enabled)
+        if len(positions) > 1:
+            if enabled:
+                msg = _("{n} rules enabled").format(n=len(positions))
+            else:
+                msg = _("{n} rules disabled").format(n=len(positions))
+        elif enabled:
             msg = _("Rule enabled")
         else:
             msg = _("Rule disabled")
+        self.rulesList.Refresh()
         core.callLater(100, lambda: ui.message(msg))
         self.onListItemFocused(None)
 
     def OnAddClick(self,evt):
         entryDialog=AudioRuleDialog(self,title=_("Add audio rule"))
         if entryDialog.ShowModal()==wx.ID_OK:
-            self.rules.append(entryDialog.rule)
-            self.rulesList.ItemCount = len(self.rules)
-            index = self.rulesList.ItemCount - 1
-            self.rulesList.Select(index)
-            self.rulesList.Focus(index)
-            # We don't get a new focus event with the new index.
-            self.rulesList.sendListItemFocusedEvent(index)
+            self.updateList(self.model.add([entryDialog.rule]))
             self.rulesList.SetFocus()
-            entryDialog.Destroy()
+        entryDialog.releaseTestRule()
+        entryDialog.Destroy()
 
     def OnEditClick(self,evt):
         if self.rulesList.GetSelectedItemCount()!=1:
@@ -967,60 +2918,104 @@ class RulesDialog(SettingsPanel):
         if editIndex<0:
             return
         entryDialog=AudioRuleDialog(self)
-        entryDialog.editRule(self.rules[editIndex])
+        entryDialog.editRule(self.model.getRule(editIndex))
         if entryDialog.ShowModal()==wx.ID_OK:
-            self.rules[editIndex] = entryDialog.rule
+            self.model.replace(editIndex, entryDialog.rule)
+            self.rulesList.Refresh()
             self.rulesList.SetFocus()
+        entryDialog.releaseTestRule()
         entryDialog.Destroy()
 
     def OnMoveClick(self,evt, increment):
-        if self.rulesList.GetSelectedItemCount()!=1:
+        positions = self.getSelectedPositions()
+        if not positions:
             return
-        index=self.rulesList.GetFirstSelected()
-        if index<0:
+        newPositions = self.model.move(positions, increment)
+        if newPositions != positions:
+            self.updateList(newPositions)
+
+    def OnRemoveClick(self,evt):
+        positions = self.getSelectedPositions()
+        if not positions:
             return
-        newIndex = index + increment
-        if 0 <= newIndex < len(self.rules):
-            # Swap
-            tmp = self.rules[index]
-            self.rules[index] = self.rules[newIndex]
-            self.rules[newIndex] = tmp
-            self.rulesList.Select(newIndex)
-            self.rulesList.Focus(newIndex)
+        self.model.remove(positions)
+        if len(self.model) > 0:
+            self.updateList([min(positions[0], len(self.model) - 1)])
         else:
-            return
-
-    def OnToggleEnable(self,evt, increment):
-        pass
+            self.updateList()
+        self.rulesList.SetFocus()
 
-    def OnRemoveClick(self,evt):
-        index=self.rulesList.GetFirstSelected()
-        while index>=0:
-            self.rulesList.DeleteItem(index)
-            del self.rules[index]
-            index=self.rulesList.GetNextSelected(index)
+    def OnImportClick(self, evt):
+        with wx.FileDialog(
+            self,
+            _("Import rules"),
+            wildcard=_("Rule packs (*.json)|*.json"),
+            style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
+        ) as fd:
+            if fd.ShowModal() != wx.ID_OK:
+                return
+            fileName = fd.GetPath()
+        try:
+            newRules, failed, disabled = loadRulePack(fileName)
+        except (OSError, ValueError) as e:
+            log.error("Failed to import earcon frenzy rules", e)
+            gui.messageBox(_("Failed to import rules: {error}").format(error=e), _("Import rules"), wx.OK | wx.ICON_ERROR, self)
+            return
+        self.updateList(self.model.add(newRules))
         self.rulesList.SetFocus()
+        if failed:
+            msg = _("{n} rules imported, {failed} rules could not be loaded").format(n=len(newRules), failed=failed)
+        else:
+            msg = _("{n} rules imported").format(n=len(newRules))
+        if disabled:
+            msg += ", " + _("{disabled} rules disabled because their pattern is slow to match").format(disabled=disabled)
+        core.callLater(100, lambda: ui.message(msg))
+
+    def OnExportClick(self, evt):
+        positions = self.getSelectedPositions()
+        if len(positions) > 1:
+            rulesToExport = [self.model.getRule(position) for position in positions]
+        else:
+            rulesToExport = [self.model.getRule(position) for position in range(len(self.model))]
+        with wx.FileDialog(
+            self,
+            _("Export rules"),
+            wildcard=_("Rule packs (*.json)|*.json"),
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        ) as fd:
+            if fd.ShowModal() != wx.ID_OK:
+                return
+            fileName = fd.GetPath()
+        try:
+            saveRulePack(fileName, rulesToExport)
+        except OSError as e:
+            log.error("Failed to export earcon frenzy rules", e)
+            gui.messageBox(_("Failed to export rules: {error}").format(error=e), _("Export rules"), wx.OK | wx.ICON_ERROR, self)
+            return
+        msg = _("{n} rules exported").format(n=len(rulesToExport))
+        core.callLater(100, lambda: ui.message(msg))
 
     def onSave(self):
         global rulesDialogOpen
         rulesDialogOpen = False
-        rulesDicts = [rule.asDict() for rule in self.rules]
-        rulesJson = json.dumps(rulesDicts, indent=4, sort_keys=True)
-        rulesFile = open(rulesFileName, "w")
-        try:
-            rulesFile.write(rulesJson)
-        finally:
-            rulesFile.close()
-        reloadRules()
+        if not self.model.modified:
+            releaseCommands(getRuleCommands(self.model.discarded), getRuleCommands(rules))
+            return
+        saveRulePack(rulesFileName, self.model.rules)
+        # Rules in the model are already compiled, no need to load them again from disk.
+        publishRules(list(self.model.rules))
+        releaseCommands(getRuleCommands(self.model.discarded), getRuleCommands(rules))
 
     def onDiscard(self):
         global rulesDialogOpen
         rulesDialogOpen = False
+        releaseCommands(getRuleCommands(self.model.rules + self.model.discarded), getRuleCommands(rules))
 
 original_getTextInfoSpeech = None
 original_getPropertiesSpeech = None
 original_processAndLabelStates = None
 originalSpeechCancel = None
+original_speak = None
 originalTonesInitialize = None
 
 class FakeTextInfo(textInfos.TextInfo):
@@ -1046,61 +3041,125 @@ class FakeTextInfo(textInfos.TextInfo):
     def _get_text(self) -> str:
         raise NotImplementedError
 
+frenzyStateKey = 'frenzyCache'
+class FrenzyState:
+    """
+    State carried by earcon frenzy processors from one textInfo speech call to the next,
+    e.g. when moving line by line.
+    It lives in SpeakTextInfoState.formatFieldAttributesCache under frenzyStateKey.
+    Stored states are never mutated: processors work on a copy,
+    and version is bumped only when the copy differs from the original.
+    """
+    __slots__ = (
+        'version',
+        'headingLevel',
+        'bold',
+    )
+    fieldNames = __slots__[1:]
+
+    def __init__(self, version=0, headingLevel=None, bold=None):
+        self.version = version
+        self.headingLevel = headingLevel
+        self.bold = bold
+
+    def copy(self):
+        result = FrenzyState.__new__(FrenzyState)
+        for name in FrenzyState.__slots__:
+            setattr(result, name, getattr(self, name))
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, FrenzyState):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name)
+            for name in FrenzyState.fieldNames
+        )
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in FrenzyState.__slots__)
+        return f"FrenzyState({values})"
+
+emptyFrenzyState = FrenzyState()
+
+def getFrenzyState(speakTextInfoState):
+    try:
+        state = speakTextInfoState.formatFieldAttributesCache[frenzyStateKey]
+    except (AttributeError, KeyError, TypeError):
+        return emptyFrenzyState
+    if not isinstance(state, FrenzyState):
+        return emptyFrenzyState
+    return state
+
+def commitFrenzyState(oldState, state):
+    # Returns the state to be stored: the old object itself if nothing changed.
+    if state == oldState:
+        return oldState
+    state.version = oldState.version + 1
+    return state
+
+def storeFrenzyState(formatFieldAttributesCache, state):
+    if formatFieldAttributesCache.get(frenzyStateKey) is not state:
+        formatFieldAttributesCache[frenzyStateKey] = state
+
 def processHeadings(
         fields,
         newCommands,
-        controlEnds,
-        controlTail,
-        frenzyCache,
+        controlTree,
+        frenzyState,
         unit ,
         reason,
         skipIndices,
 ):
-    # Processing headings level 1
-    frenzyLevel = frenzyCache.get('level')
-    frenzyCache['level'] = None
-    for i, field in enumerate(fields):
+    frenzyLevel = frenzyState.headingLevel
+    frenzyState.headingLevel = None
+    # Only controlStart fields are visited, from the index rather than by scanning fields.
+    for i in controlTree.starts:
+        field = fields[i]
         try:
-            if field.command != 'controlStart':
-                continue
             if field.field['role'] != Role.HEADING:
                 continue
             level = int(field.field['level'])
-            if level != 1:
-                continue
         except (AttributeError, KeyError, ValueError):
             continue
-        # At this point we're at the start of heading level 1
+        # At this point we're at the start of a heading
         start = i
-        end = controlEnds[i]
+        end = controlTree.end[i]
 
         skipIndices.add(start)
         skipIndices.add(end)
-        mylog(f"reason={OutputReason(reason)} unit={unit} level={level} frenzyLevel={frenzyLevel}")
+        if traceLevel >= TRACE_DEBUG:
+            trace(TRACE_DEBUG, "reason=%s unit=%s level=%s frenzyLevel=%s", OutputReason(reason), unit, level, frenzyLevel)
         if(
             reason in [OutputReason.FOCUS, OutputReason.QUICKNAV]
             or unit in (textInfos.UNIT_LINE, textInfos.UNIT_PARAGRAPH)
             or level != frenzyLevel
         ):
-            #tones.beep(500, 50)
-            #headingCommand.run()
             frenzyLevel = level
-            newCommands[start].append(headingCommand)
-        frenzyCache['level'] = level if end >= controlTail else None
+            newCommands[start].append(getHeadingCommand(level))
+        frenzyState.headingLevel = level if end >= controlTree.tail else None
     return None, None
 
 def processBold(
         fields,
         newCommands,
-        controlEnds,
-        controlTail,
-        frenzyCache,
+        controlTree,
+        frenzyState,
         unit ,
         reason,
         skipIndices,
 ):
-    frenzyBold = frenzyCache.get('bold')
+    frenzyBold = frenzyState.bold
     oldBold = None
+    pitchChanged = False
     for i, field in enumerate(fields):
         try:
             if field.command != 'formatChange':
@@ -1116,45 +3175,160 @@ def processBold(
         if bold != oldBold:
             if bold:
                 newCommands[i].append(speech.commands.PitchCommand(offset=-10))
+                pitchChanged = True
             elif oldBold:
                 newCommands[i].append(speech.commands.PitchCommand(offset=10))
+                pitchChanged = True
             else:
                 #bold == False and oldBold is None
                 pass
             oldBold = bold
-    newCommands[None].append(speech.commands.PitchCommand(multiplier=1))
-    frenzyCache['bold'] = oldBold 
+    if pitchChanged:
+        newCommands[None].append(speech.commands.PitchCommand(multiplier=1))
+    frenzyState.bold = oldBold
 
-def computeControlEnds(fields):
-    # Returns dict mapping from begin index of a control field to end index.
-    stack = []
-    result = {}
-    for i, field in enumerate(fields):
-        try:
-            if field.command == 'controlStart':
+class ControlTree:
+    """
+    Index of control fields of one fields list, shared by all processors.
+    Built in a single pass that only looks at control fields:
+    starts - positions of controlStart fields in order;
+    end - maps position of each controlStart to position of its controlEnd;
+    tail - the position after which only controlEnd fields follow.
+    Columns for tree queries are arrays indexed by field position, built on first use:
+    parent - position of the innermost controlStart enclosing the field, -1 at top level;
+    for a controlEnd, the same as for its controlStart;
+    depth - number of controls enclosing the field, counted the same way;
+    start - for a controlEnd, position of its controlStart, -1 for other fields.
+    Malformed streams are tolerated: a controlEnd without a controlStart is treated like a plain field,
+    and an unclosed controlStart ends at len(fields), i.e. it continues past this utterance.
+    """
+    __slots__ = ("fields", "starts", "end", "tail", "malformed", "_parent", "_depth", "_start")
+
+    def __init__(self, fields):
+        starts = []
+        end = {}
+        stack = []
+        # Positions of controlEnd fields without a controlStart
+        strays = set()
+        for i, field in enumerate(fields):
+            if isinstance(field, str):
+                continue
+            command = getattr(field, "command", None)
+            if command == 'controlStart':
+                starts.append(i)
                 stack.append(i)
-            elif field.command == 'controlEnd':
-                try:
-                    begin = stack.pop()
-                except IndexError as e:
-                    api.ff = fields
-                    raise RuntimeError("Empty stack of control fields!", e)
-                result[begin] = i
-        except AttributeError:
-            continue
-    if len(stack) != 0:
-        raise RuntimeError("Control field stack is not empty!")
-    return result
-
-def computeControlTail(fields):
-    # Control Tail is the index after which we only see controlEnd fields
-    for i in range(len(fields) - 1, -1, -1):
-        try:
-            if fields[i].command != 'controlEnd':
-                return i + 1
-        except AttributeError:
-            return i + 1
-    raise RuntimeError("Malformed textInfo fields!")
+            elif command == 'controlEnd':
+                if stack:
+                    end[stack.pop()] = i
+                else:
+                    strays.add(i)
+        n = len(fields)
+        for begin in stack:
+            end[begin] = n
+        tail = n
+        while tail > 0:
+            field = fields[tail - 1]
+            if isinstance(field, str) or getattr(field, "command", None) != 'controlEnd' or tail - 1 in strays:
+                break
+            tail -= 1
+        self.fields = fields
+        self.starts = starts
+        self.end = end
+        self.tail = tail
+        self.malformed = bool(stack or strays)
+        self._parent = None
+        self._depth = None
+        self._start = None
+
+    def buildColumns(self):
+        n = len(self.fields)
+        end = self.end
+        parent = array.array("i", [-1]) * n
+        depth = array.array("i", [0]) * n
+        start = array.array("i", [-1]) * n
+        for begin, i in end.items():
+            if i < n:
+                start[i] = begin
+        stack = []
+        current = -1
+        # Plain fields take parent and depth of the preceding control field,
+        # so they are filled in runs and only control fields are visited.
+        runStart = 0
+        for i in sorted(self.starts + [i for i in end.values() if i < n]):
+            if i > runStart:
+                parent[runStart:i] = array.array("i", [current]) * (i - runStart)
+                depth[runStart:i] = array.array("i", [len(stack)]) * (i - runStart)
+            runStart = i + 1
+            if start[i] >= 0:
+                stack.pop()
+                current = stack[-1] if stack else -1
+            parent[i] = current
+            depth[i] = len(stack)
+            if start[i] < 0:
+                stack.append(i)
+                current = i
+        if n > runStart:
+            parent[runStart:n] = array.array("i", [current]) * (n - runStart)
+            depth[runStart:n] = array.array("i", [len(stack)]) * (n - runStart)
+        self._parent = parent
+        self._depth = depth
+        self._start = start
+
+    @property
+    def parent(self):
+        if self._parent is None:
+            self.buildColumns()
+        return self._parent
+
+    @property
+    def depth(self):
+        if self._depth is None:
+            self.buildColumns()
+        return self._depth
+
+    @property
+    def start(self):
+        if self._start is None:
+            self.buildColumns()
+        return self._start
+
+    def isAncestor(self, ancestor, i):
+        """ Whether field i is inside the control starting at ancestor. """
+        return ancestor < i < self.end.get(ancestor, -1)
+
+    def ancestors(self, i):
+        """ Yields positions of controls enclosing field i, innermost first. """
+        parent = self.parent
+        i = parent[i]
+        while i >= 0:
+            yield i
+            i = parent[i]
+
+    def findAncestor(self, i, role):
+        """ Returns position of the innermost control with role enclosing field i, or -1. """
+        fields = self.fields
+        for ancestor in self.ancestors(i):
+            if fields[ancestor].field.get('role') == role:
+                return ancestor
+        return -1
+
+    def nextSibling(self, i):
+        """ Returns position of the field following field i, or its control, at the same level, or -1. """
+        parent = self.parent
+        j = self.end.get(i, i) + 1
+        if j < len(parent) and self.start[j] < 0 and parent[j] == parent[i]:
+            return j
+        return -1
+
+    def previousSibling(self, i):
+        """ Returns position of the field preceding field i, or its control, at the same level, or -1. """
+        parent = self.parent
+        j = i - 1
+        if j < 0 or parent[j] != parent[i] or j == parent[i]:
+            return -1
+        if self.start[j] >= 0:
+            return self.start[j]
+        return j
 
 def SplitFields(
         info,
@@ -1202,7 +3376,9 @@ def SplitFields(
         elif field.command == 'controlStart':
             stack.append(field)
         elif field.command == 'controlEnd':
-            stack.pop()
+            # Unbalanced controlEnd is passed through, see ControlTree.
+            if stack:
+                stack.pop()
         else:
             raise RuntimeError(f"Unknown command {type(field)} {field}")
 
@@ -1217,8 +3393,9 @@ def new_getTextInfoSpeech(
         onlyInitialFields = False,
         suppressBlanks = False,
 ):
+    settings = getSettings()
     if (
-        not config.conf[pp]["enabled"]
+        not settings.enabled
         or rulesDialogOpen
         or onlyInitialFields
     ):
@@ -1233,65 +3410,74 @@ def new_getTextInfoSpeech(
             suppressBlanks ,
         )
         return
-    mylog(f"useCache={useCache}")
     if isinstance(useCache,SpeakTextInfoState):
         speakTextInfoState=useCache
     elif useCache:
         speakTextInfoState=SpeakTextInfoState(info.obj)
     else:
         speakTextInfoState=None
-    mylog("speakInfoState in the beginning")
-    mylog(speakTextInfoState.formatFieldAttributesCache)
-    try:
-        frenzyCache = speakTextInfoState.formatFieldAttributesCache['frenzyCache']
-    except (AttributeError, KeyError):
-        frenzyCache = {}
+    oldFrenzyState = getFrenzyState(speakTextInfoState)
+    frenzyState = oldFrenzyState.copy()
     extraDetail=unit in (textInfos.UNIT_CHARACTER,textInfos.UNIT_WORD)
     if not formatConfig:
-        formatConfig=config.conf["documentFormatting"]
-    formatConfig=formatConfig.copy()
-    if extraDetail:
-        formatConfig['extraDetail']=True
+        formatConfig = settings.extraDetailFormatConfig if extraDetail else settings.formatConfig
+    else:
+        formatConfig=formatConfig.copy()
+        if extraDetail:
+            formatConfig['extraDetail']=True
 
+    startTime = time.perf_counter()
     fields = info.getTextWithFields(formatConfig)
-    mylog("original fields :")
-    mylog(prettyFields(fields))
-    mylog(frenzyCache)
+    recordLatency("getTextWithFields", startTime)
+    recorder = captureRecorder
+    if recorder is not None:
+        # When capturing, output is collected and only yielded once the record is written,
+        # so that our own processing time can be measured separately from the original function.
+        capture = {
+            "type": "textInfo",
+            "unit": unit,
+            "reason": encodeCaptureValue(reason),
+            "frenzyState": {name: getattr(oldFrenzyState, name) for name in FrenzyState.fieldNames},
+            "fields": encodeCaptureValue(fields),
+            "chunks": [],
+        }
+        captureOutput = []
+        captureStartTime = time.perf_counter()
+        excludedTime = 0
+    if traceLevel >= TRACE_DEBUG:
+        trace(TRACE_DEBUG, "useCache=%s frenzyState=%s original fields:\n%s", useCache, oldFrenzyState, prettyFields(fields))
 
+    startTime = time.perf_counter()
     funcs = [processHeadings, processBold]
-    controlEnds = computeControlEnds(fields)
-    controlTail = computeControlTail(fields)
+    controlTree = ControlTree(fields)
+    if controlTree.malformed and traceLevel >= TRACE_INFO:
+        trace(TRACE_INFO, "Unbalanced control fields")
     newCommands = collections.defaultdict(list)
     skipIndices = set()
     for func in funcs:
         func(
             fields,
             newCommands,
-            controlEnds,
-            controlTail,
-            frenzyCache,
+            controlTree,
+            frenzyState,
             unit ,
             reason,
             skipIndices,
         )
-    mylog("newCommands and frenzyCache:")
-    mylog(newCommands)
-    mylog(frenzyCache)
-    mylog("Split done and returning")
-    for item in SplitFields(
+    frenzyState = commitFrenzyState(oldFrenzyState, frenzyState)
+    recordLatency("fieldAnalysis", startTime)
+    if traceLevel >= TRACE_DEBUG:
+        trace(TRACE_DEBUG, "newCommands=%s frenzyState=%s", dict(newCommands), frenzyState)
+    for item in timeGenerator("splitFields", SplitFields(
             info,
             fields,
             newCommands,
             skipIndices,
-    ):
+    )):
         if isinstance(item, FakeTextInfo):
-            cond = item.obj == info.obj
-            mylog(f"cond = {cond}")
-            mylog(f"item.obj = {item.obj}")
-            mylog(f"info.obj={info.obj}")
-            mylog("Calling original on:")
-            mylog(prettyFields(item.getTextWithFields()))
-            yield from original_getTextInfoSpeech(
+            if traceLevel >= TRACE_DEBUG:
+                trace(TRACE_DEBUG, "Calling original on:\n%s", prettyFields(item.getTextWithFields()))
+            sequences = timeGenerator("originalGetTextInfoSpeech", original_getTextInfoSpeech(
                     item,
                     useCache ,
                     formatConfig,
@@ -1300,27 +3486,52 @@ def new_getTextInfoSpeech(
                     _prefixSpeechCommand,
                     onlyInitialFields,
                     suppressBlanks,
-            )
+            ))
+            if recorder is None:
+                yield from sequences
+            else:
+                chunkStartTime = time.perf_counter()
+                chunkFields = encodeCaptureValue(item.getTextWithFields())
+                sequences = list(sequences)
+                capture["chunks"].append({
+                    "fields": chunkFields,
+                    "output": encodeCaptureValue(sequences),
+                })
+                captureOutput.extend(sequences)
+                excludedTime += time.perf_counter() - chunkStartTime
             _prefixSpeechCommand = None
         else:
-            mylog("Returning commands")
-            mylog(prettyFields(item))
-            yield item
+            if traceLevel >= TRACE_DEBUG:
+                trace(TRACE_DEBUG, "Returning commands:\n%s", prettyFields(item))
+            if recorder is None:
+                yield item
+            else:
+                captureOutput.append(item)
     if isinstance(useCache,SpeakTextInfoState):
-        speakTextInfoState.formatFieldAttributesCache['frenzyCache'] = frenzyCache
+        storeFrenzyState(speakTextInfoState.formatFieldAttributesCache, frenzyState)
     elif useCache:
-        speakTextInfoState=SpeakTextInfoState(info.obj)
-        speakTextInfoState.formatFieldAttributesCache['frenzyCache'] = frenzyCache
-        mylog("speakInfoState in the end")
-        mylog(speakTextInfoState.formatFieldAttributesCache)
-        speakTextInfoState.updateObj()
+        # Original getTextInfoSpeech has just updated the object's state and
+        # its attributes cache is shared by reference with any copies, so
+        # there is no need to create and update a new state of our own.
+        objState = getattr(info.obj, '_speakTextInfoState', None)
+        if objState is not None:
+            storeFrenzyState(objState.formatFieldAttributesCache, frenzyState)
+        else:
+            speakTextInfoState=SpeakTextInfoState(info.obj)
+            storeFrenzyState(speakTextInfoState.formatFieldAttributesCache, frenzyState)
+            speakTextInfoState.updateObj()
+    if recorder is not None:
+        capture["ownMs"] = (time.perf_counter() - captureStartTime - excludedTime) * 1000
+        capture["output"] = encodeCaptureValue(captureOutput)
+        recorder.write(capture)
+        yield from captureOutput
 
 def new_getPropertiesSpeech(
         reason: OutputReason = OutputReason.QUERY,
         **propertyValues
 ):
     #tones.beep(500, 50)
-    if config.conf[pp]["enabled"] and not rulesDialogOpen:
+    if getSettings().enabled and not rulesDialogOpen:
         role = propertyValues.get('role')
         _role = propertyValues.get('_role')
         states = propertyValues.get('states')
@@ -1328,10 +3539,9 @@ def new_getPropertiesSpeech(
         negativeStates=propertyValues.get('negativeStates', set())
         if role is not None and states is  None:
             # Speaking role
-            if role == Role.BUTTON:
-                #return [buttonCommand]
-                #tones.beep(500, 50)
-                propertyValues['roleText'] = buttonCommand
+            roleCommand = roleCommands.get(role)
+            if roleCommand is not None:
+                propertyValues['roleText'] = roleCommand
 
         elif states is not None or negativeStates:
             #speaking states
@@ -1339,10 +3549,7 @@ def new_getPropertiesSpeech(
                 states = set()
             if False and _role == Role.CHECKBOX:
                 tones.beep(500, 50)
-                mylog(f"states={states}")
-                mylog(f"realStates={realStates}")
-                mylog(f"negativeStates={negativeStates}")
-                mylog(propertyValues)
+                trace(TRACE_DEBUG, "states=%s realStates=%s negativeStates=%s propertyValues=%s", states, realStates, negativeStates, propertyValues)
             pass
     return original_getPropertiesSpeech(        reason, **propertyValues)
 
@@ -1355,11 +3562,21 @@ def new_processAndLabelStates(
         positiveStateLabelDict=None,
         negativeStateLabelDict=None,
 ):
-    positiveStateLabelDict = positiveStateLabelDict or {}
-    negativeStateLabelDict = negativeStateLabelDict or {}
-    if config.conf[pp]["enabled"] and not rulesDialogOpen:
-        positiveStateLabelDict[State.CHECKED] = onCommand
-        negativeStateLabelDict[State.CHECKED] = offCommand
+    enabled = getSettings().enabled and not rulesDialogOpen
+    positiveLabels, negativeLabels = getStateLabelDicts(role, enabled)
+    # Caller's dicts are never modified: our labels are merged into new dicts on top of them.
+    if positiveStateLabelDict:
+        if positiveLabels:
+            positiveLabels = {**positiveStateLabelDict, **positiveLabels}
+        else:
+            positiveLabels = positiveStateLabelDict
+    if negativeStateLabelDict:
+        if negativeLabels:
+            negativeLabels = {**negativeStateLabelDict, **negativeLabels}
+        else:
+            negativeLabels = negativeStateLabelDict
+    positiveStateLabelDict = positiveLabels
+    negativeStateLabelDict = negativeLabels
     return original_processAndLabelStates(
         role,
         states,
@@ -1374,87 +3591,234 @@ def new_processAndLabelStates(
 
 
 def preCancelSpeech(*args, **kwargs):
-    localCurrentChain = currentChain
-    if localCurrentChain is not None:
-        localCurrentChain.terminate()
+    earconThrottle.noteNavigation()
+    earconThrottle.terminateAll()
     originalSpeechCancel(*args, **kwargs)
 
 def preTonesInitialize(*args, **kwargs):
     result = originalTonesInitialize(*args, **kwargs)
     try:
-        reloadRules()
+        reloadRules(background=True)
     except Exception as e:
         log.error("Error while reloading earcon frenzy rules", e)
+    try:
+        reloadRoleSounds()
+        reloadStateSounds()
+    except Exception as e:
+        log.error("Error while reloading earcon frenzy role and state sounds", e)
     return result
 
-def processRule(speechSequence, rule, symbolLevel):
+# Seconds all rules together may spend on one utterance.
+# A single regex search can't be interrupted, so the budget is checked between strings and between rules.
+ruleTimeBudget = 0.05
+# Rule taking most of the time of an utterance over budget this many times is disabled.
+ruleBudgetViolationLimit = 3
+
+def processRule(speechSequence, rule, symbolLevel, deadline=None):
+    """
+    Applies rule to all strings in speechSequence.
+    If deadline passes, remaining strings are passed through unchanged.
+    The deadline is only checked between strings: a search in progress can't be interrupted,
+    which is why rules with slow patterns are disabled when they are loaded, see disableSlowRules.
+    Returns speechSequence itself when the rule didn't match.
+    """
+    startTime = time.perf_counter()
     language=speech.getCurrentLanguage()
     newSequence = []
-    for command in speechSequence:
+    changed = False
+    for i, command in enumerate(speechSequence):
         if isinstance(command, str):
-            newSequence.extend(rule.processString(command, symbolLevel, language))
+            if deadline is not None and time.perf_counter() > deadline:
+                newSequence.extend(speechSequence[i:])
+                break
+            pieces = list(rule.processString(command, symbolLevel, language))
+            if pieces != [command]:
+                changed = True
+            newSequence.extend(pieces)
         else:
             newSequence.append(command)
-    return newSequence
+    recordLatency("ruleMatching", startTime)
+    return newSequence if changed else speechSequence
+
+def processRules(speechSequence, symbolLevel):
+    """
+    Applies all enabled rules to speechSequence within ruleTimeBudget.
+    When the budget is exceeded, remaining rules are skipped for this utterance
+    and the rule that took most time is charged with a violation.
+    Returns speechSequence itself when no rule matched.
+    """
+    currentRules = rules
+    deadline = time.perf_counter() + ruleTimeBudget
+    ruleTimes = []
+    for i, rule in enumerate(currentRules):
+        if not rule.enabled:
+            continue
+        startTime = time.perf_counter()
+        speechSequence = processRule(speechSequence, rule, symbolLevel, deadline)
+        now = time.perf_counter()
+        ruleTimes.append((now - startTime, rule))
+        if now > deadline:
+            slowest = max(ruleTimes, key=operator.itemgetter(0))[1]
+            if traceLevel >= TRACE_INFO:
+                trace(TRACE_INFO, "Rule time budget exceeded after %d of %d rules, slowest rule %r", i + 1, len(currentRules), slowest.pattern)
+            reportRuleBudgetViolation(slowest)
+            break
+    return speechSequence
+
+def reportRuleBudgetViolation(rule):
+    rule.budgetViolations += 1
+    if rule.enabled and rule.budgetViolations >= ruleBudgetViolationLimit:
+        rule.enabled = False
+        log.warning(
+            f"Earcon frenzy rule {rule.getDisplayName()!r} exceeded the time budget of {ruleTimeBudget * 1000:.0f} ms "
+            f"{rule.budgetViolations} times and has been disabled until rules are reloaded. "
+            "Consider simplifying its pattern."
+        )
+
+def new_speak(speechSequence, symbolLevel=None, *args, **kwargs):
+    if not getSettings().enabled:
+        return original_speak(speechSequence, symbolLevel, *args, **kwargs)
+    speechSequence = list(speechSequence)
+    newSequence = speechSequence
+    if rules and not rulesDialogOpen:
+        if symbolLevel is None:
+            symbolLevel = config.conf["speech"]["symbolLevel"]
+        newSequence = processRules(speechSequence, symbolLevel)
+    if newSequence is not speechSequence:
+        # Chains earcons inserted by rules, then optimizes the sequence.
+        speechSequence = postProcessSynchronousCommands(newSequence, symbolLevel)
+    else:
+        # Heading, role and state earcons are left as they are, only redundant commands are removed.
+        speechSequence = optimizeSpeechSequence(speechSequence)
+    return original_speak(speechSequence, symbolLevel, *args, **kwargs)
 
 def postProcessSynchronousCommands(speechSequence, symbolLevel):
+    recorder = captureRecorder
+    if recorder is not None:
+        capture = {
+            "type": "sequence",
+            "symbolLevel": symbolLevel,
+            "input": encodeCaptureValue(speechSequence),
+        }
+        captureStartTime = time.perf_counter()
     language=speech.getCurrentLanguage()
-    speechSequence = [element for element in speechSequence
-        if not isinstance(element, str)
-        or not speech.isBlank(speech.processText(language,element,symbolLevel))
-    ]
-
+    # Single pass: blank strings are dropped, so they don't split chains,
+    # and consecutive synchronous commands are grouped into a chain followed by a break of the same duration.
     newSequence = []
-    for (isSynchronous, values) in itertools.groupby(speechSequence, key=lambda x: isinstance(x, PpSynchronousCommand)):
-        if isSynchronous:
-            chain = PpChainCommand(list(values))
-            duration = chain.getDuration()
-            newSequence.append(chain)
-            newSequence.append(speech.commands.BreakCommand(duration))
-        else:
-            newSequence.extend(values)
-    newSequence = eloquenceFix(newSequence, language, symbolLevel)
+    chainBreaks = []
+    subcommands = []
+    hasSpeech = False
+    for element in speechSequence:
+        if isinstance(element, PpSynchronousCommand):
+            subcommands.append(element)
+            continue
+        if isinstance(element, str):
+            if speech.isBlank(speech.processText(language,element,symbolLevel)):
+                continue
+            hasSpeech = True
+        if subcommands:
+            appendChain(newSequence, chainBreaks, subcommands)
+            subcommands = []
+        newSequence.append(element)
+    if subcommands:
+        appendChain(newSequence, chainBreaks, subcommands)
+    if not hasSpeech and chainBreaks:
+        # With some versions of eloquence driver, when the entire utterance has been replaced with audio icons, and therefore there is nothing else to speak,
+        # the driver for some reason issues the callback command after the break command, not before.
+        # To work around this, breaks after chains are removed in this case.
+        chainBreaks = set(map(id, chainBreaks))
+        newSequence = [element for element in newSequence if id(element) not in chainBreaks]
+    newSequence = optimizeSpeechSequence(newSequence)
+    if recorder is not None:
+        capture["ownMs"] = (time.perf_counter() - captureStartTime) * 1000
+        capture["output"] = encodeCaptureValue(newSequence)
+        recorder.write(capture)
     return newSequence
 
-def eloquenceFix(speechSequence, language, symbolLevel):
+prosodyCommandTypes = (
+    speech.commands.PitchCommand,
+    speech.commands.VolumeCommand,
+    speech.commands.RateCommand,
+)
+
+def optimizeSpeechSequence(speechSequence):
     """
-    With some versions of eloquence driver, when the entire utterance has been replaced with audio icons, and therefore there is nothing else to speak,
-    the driver for some reason issues the callback command after the break command, not before.
-    To work around this, we detect this case and remove break command completely.
+    Removes redundant commands without changing what is spoken:
+    adjacent strings are merged, consecutive breaks are collapsed into one,
+    and of the prosody commands of one kind issued before a string only the last one is kept,
+    unless it sets the value already in effect.
+    Prosody commands at the end of the sequence are kept, as the synth may carry them over to the next utterance.
     """
-    nonEmpty = [element for element in speechSequence
-        if  isinstance(element, str)
-        and not speech.isBlank(speech.processText(language,element,symbolLevel))
-    ]
-    if len(nonEmpty) > 0:
-        return speechSequence
-    indicesToRemove = []
-    for i in range(1, len(speechSequence)):
-        if  (
-            isinstance(speechSequence[i], speech.commands.BreakCommand)
-            and isinstance(speechSequence[i-1], PpChainCommand)
+    result = []
+    # Prosody command type to latest command not yet followed by a string
+    pendingProsody = {}
+    # Prosody command type to (offset, multiplier) in effect, when known
+    currentProsody = {}
+    def flushProsody():
+        for commandType, command in pendingProsody.items():
+            value = (command.offset, command.multiplier)
+            if currentProsody.get(commandType) != value:
+                result.append(command)
+                currentProsody[commandType] = value
+        pendingProsody.clear()
+    for element in speechSequence:
+        if isinstance(element, str):
+            if not element:
+                continue
+            if pendingProsody:
+                flushProsody()
+            if result and isinstance(result[-1], str):
+                result[-1] += element
+            else:
+                result.append(element)
+        elif isinstance(element, prosodyCommandTypes):
+            pendingProsody.pop(type(element), None)
+            pendingProsody[type(element)] = element
+        elif (
+            isinstance(element, speech.commands.BreakCommand)
+            and result
+            and type(result[-1]) is speech.commands.BreakCommand
         ):
-            indicesToRemove.append(i)
-    return [speechSequence[i] for i in range(len(speechSequence)) if i not in indicesToRemove]
+            # Commands may be shared between sequences, so merged break is a new command.
+            result[-1] = speech.commands.BreakCommand(result[-1].time + element.time)
+        else:
+            result.append(element)
+    flushProsody()
+    return result
+
+def appendChain(sequence, chainBreaks, subcommands):
+    chain = PpChainCommand(subcommands, maxDuration=earconThrottle.getMaxDuration())
+    breakCommand = speech.commands.BreakCommand(chain.getDuration())
+    sequence.append(chain)
+    sequence.append(breakCommand)
+    chainBreaks.append(breakCommand)
 
 
 class GlobalPlugin(globalPluginHandler.GlobalPlugin):
     scriptCategory = _("Earcon Frenzy")
 
     def __init__(self, *args, **kwargs):
+        startTime = time.perf_counter()
         super(GlobalPlugin, self).__init__(*args, **kwargs)
         self.createMenu()
         self.injectSpeechInterceptor()
+        for notification in configChangeNotifications:
+            getattr(config, notification).register(refreshSettings)
+        recordStartup("globalPluginInit", startTime)
 
     def createMenu(self):
         gui.settingsDialogs.NVDASettingsDialog.categoryClasses.append(RulesDialog)
 
     def terminate(self):
         self.restoreSpeechInterceptor()
+        for notification in configChangeNotifications:
+            getattr(config, notification).unregister(refreshSettings)
+        stopCapture()
+        soundPreviewer.terminate()
         gui.settingsDialogs.NVDASettingsDialog.categoryClasses.remove(RulesDialog)
 
     def injectSpeechInterceptor(self):
-        global original_getTextInfoSpeech, original_getPropertiesSpeech, original_processAndLabelStates, originalSpeechCancel, originalTonesInitialize
+        global original_getTextInfoSpeech, original_getPropertiesSpeech, original_processAndLabelStates, originalSpeechCancel, originalTonesInitialize, original_speak
         original_getTextInfoSpeech = speech.speech.getTextInfoSpeech
         speech.speech.getTextInfoSpeech = new_getTextInfoSpeech
         original_getPropertiesSpeech = speech.speech.getPropertiesSpeech
@@ -1465,20 +3829,98 @@ class GlobalPlugin(globalPluginHandler.GlobalPlugin):
         speech.cancelSpeech = preCancelSpeech
         originalTonesInitialize = tones.initialize
         tones.initialize = preTonesInitialize
+        # speech.speak is a separate binding of speech.speech.speak, both are replaced.
+        original_speak = speech.speech.speak
+        speech.speech.speak = new_speak
+        speech.speak = new_speak
 
     def  restoreSpeechInterceptor(self):
-        global original_getTextInfoSpeech, original_getPropertiesSpeech, original_processAndLabelStates, originalSpeechCancel, originalTonesInitialize
+        global original_getTextInfoSpeech, original_getPropertiesSpeech, original_processAndLabelStates, originalSpeechCancel, originalTonesInitialize, original_speak
         speech.speech.getTextInfoSpeech = original_getTextInfoSpeech
         speech.speech.getPropertiesSpeech = original_getPropertiesSpeech
         controlTypes.processAndLabelStates = original_processAndLabelStates
         speech.cancelSpeech = originalSpeechCancel
         tones.initialize = originalTonesInitialize
+        speech.speech.speak = original_speak
+        speech.speak = original_speak
+
+    def event_gainFocus(self, obj, nextHandler):
+        updateSpatialPan(obj)
+        nextHandler()
 
     @script(description='Toggle Earcon Frenzy.', gestures=['kb:NVDA+Alt+f'])
     def script_togglePp(self, gesture):
         config.conf[pp]["enabled"] = not config.conf[pp]["enabled"]
+        refreshSettings()
         if config.conf[pp]["enabled"]:
             msg = _("Earcon Frenzy on")
         else:
             msg = _("Earcon Frenzy off")
         ui.message(msg)
+
+    @script(description='Toggle positional panning of Earcon Frenzy sounds.')
+    def script_toggleSpatialPanning(self, gesture):
+        config.conf[pp]["spatialPanning"] = not config.conf[pp]["spatialPanning"]
+        refreshSettings()
+        updateSpatialPan(api.getFocusObject())
+        if config.conf[pp]["spatialPanning"]:
+            msg = _("Spatial panning on")
+        else:
+            msg = _("Spatial panning off")
+        ui.message(msg)
+
+    @script(description='Report Earcon Frenzy latency statistics and export them to a JSON file.', gestures=['kb:NVDA+Alt+Control+f'])
+    def script_reportLatency(self, gesture):
+        report = formatLatencyReport()
+        try:
+            exportLatencyStats(latencyFileName)
+            report += "\n" + _("Exported to {fileName}").format(fileName=latencyFileName)
+        except OSError as e:
+            log.error("Failed to export earcon frenzy latency statistics", e)
+        ui.browseableMessage(report, _("Earcon Frenzy latency"))
+
+    @script(description='Report sounds, players and memory held by Earcon Frenzy.')
+    def script_reportResources(self, gesture):
+        ui.browseableMessage(formatResourceReport(), _("Earcon Frenzy resources"))
+
+    @script(description='Reset Earcon Frenzy latency statistics.')
+    def script_resetLatency(self, gesture):
+        for histogram in latencyStats.values():
+            histogram.reset()
+        ui.message(_("Latency statistics reset"))
+
+    @script(description='Start or stop capturing fields and speech sequences for offline replay.')
+    def script_toggleCapture(self, gesture):
+        if captureRecorder is None:
+            try:
+                fileName = startCapture()
+            except OSError as e:
+                log.error("Failed to start earcon frenzy capture", e)
+                ui.message(_("Failed to start capture"))
+                return
+            ui.message(_("Capturing to {fileName}").format(fileName=fileName))
+        else:
+            recorder = stopCapture()
+            ui.message(_("Capture stopped, {n} records written").format(n=recorder.count))
+
+    @script(description='Cycle Earcon Frenzy trace level.')
+    def script_cycleTraceLevel(self, gesture):
+        level = (config.conf[pp]["traceLevel"] + 1) % (TRACE_DEBUG + 1)
+        config.conf[pp]["traceLevel"] = level
+        applyTraceConfiguration()
+        ui.message(_("Earcon Frenzy tracing: {level}").format(level=traceLevelNames.get(level, _("off"))))
+
+    @script(description='Dump Earcon Frenzy trace buffer to a file.', gestures=['kb:NVDA+Alt+Shift+f'])
+    def script_dumpTrace(self, gesture):
+        if traceBuffer is None:
+            ui.message(_("Earcon Frenzy tracing is off"))
+            return
+        try:
+            n = dumpTrace(traceFileName)
+        except OSError as e:
+            log.error("Failed to dump earcon frenzy trace", e)
+            ui.message(_("Failed to dump trace"))
+            return
+        ui.message(_("Dumped {n} trace records to {fileName}").format(n=n, fileName=traceFileName))
+
+recordStartup("moduleBody", moduleStartTime)
@@ -0,0 +1,295 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Offline benchmark of the text-info pipeline of earconFrenzy.py.
+Runs on plain CPython with NVDA modules replaced by tools/nvdaStubs.py.
+
+Usage:
+    python tools/benchTextInfo.py                  # run and compare against baseline
+    python tools/benchTextInfo.py --save-baseline  # run and store results as the new baseline
+    python tools/benchTextInfo.py -k bold          # run only cases whose name contains "bold"
+
+Throughput is normalized by a fixed pure-Python calibration workload,
+so that a baseline recorded on one machine is meaningful on another.
+Each case is measured in several rounds. In every round calibration runs right before
+the case, so both see the same machine load, and the median score over rounds is reported.
+Exits with status 1 if any case regressed beyond tolerance.
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import nvdaStubs
+
+baselineFileName = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchTextInfoBaseline.json")
+words = "the quick brown fox jumps over the lazy dog while earcons play".split()
+
+def makeWords(n):
+    return [words[i % len(words)] for i in range(n)]
+
+def flatParagraph(textInfos, nWords=400):
+    # One format field followed by a long run of text, as in a plain paragraph.
+    result = [textInfos.FieldCommand("formatChange", {"bold": False, "font-name": "Arial"})]
+    for i in range(0, nWords, 8):
+        result.append(" ".join(makeWords(8)) + " ")
+    return result
+
+def deeplyNested(textInfos, Role, depth=40):
+    # Lists inside tables inside lists, with a level 1 heading at the bottom.
+    roles = [Role.LIST, Role.LISTITEM, Role.TABLE, Role.TABLEROW, Role.TABLECELL]
+    result = []
+    for i in range(depth):
+        result.append(textInfos.FieldCommand("controlStart", {"role": roles[i % len(roles)]}))
+        result.append(textInfos.FieldCommand("formatChange", {"bold": i % 2 == 0}))
+        result.append(words[i % len(words)])
+    result.append(textInfos.FieldCommand("controlStart", {"role": Role.HEADING, "level": "1"}))
+    result.append("heading text")
+    result.append(textInfos.FieldCommand("controlEnd", None))
+    result.extend(textInfos.FieldCommand("controlEnd", None) for i in range(depth))
+    return result
+
+def formatPerWord(textInfos, nWords=300):
+    # Format changes on every word, e.g. spell checker markup or syntax highlighting.
+    result = []
+    for i, word in enumerate(makeWords(nWords)):
+        result.append(textInfos.FieldCommand("formatChange", {"bold": i % 2 == 0, "font-name": "Arial"}))
+        result.append(word + " ")
+    return result
+
+def headingRun(textInfos, Role, nHeadings=50):
+    result = []
+    for i in range(nHeadings):
+        result.append(textInfos.FieldCommand("controlStart", {"role": Role.HEADING, "level": str(1 + i % 3)}))
+        result.append(textInfos.FieldCommand("formatChange", {"bold": True}))
+        result.append(f"heading {i}")
+        result.append(textInfos.FieldCommand("controlEnd", None))
+        result.append(" ".join(makeWords(10)))
+    return result
+
+def copyFields(textInfos, fields):
+    # processBold consumes format fields, so each run needs fresh ones.
+    return [
+        textInfos.FieldCommand(f.command, dict(f.field) if f.field is not None else None)
+        if isinstance(f, textInfos.FieldCommand) else f
+        for f in fields
+    ]
+
+
+class SyntheticTextInfo:
+    def __init__(self, plugin, obj, fields):
+        self.obj = obj
+        self.fields = fields
+        self.textInfos = plugin.textInfos
+
+    def getTextWithFields(self, formatConfig=None):
+        return copyFields(self.textInfos, self.fields)
+
+
+class Case:
+    def __init__(self, name, setup, run, describe=None):
+        self.name = name
+        self.setup = setup
+        self.run = run
+        # Returns a line of case specific statistics, printed after the results
+        self.describe = describe
+
+
+def makeCases(plugin):
+    textInfos = plugin.textInfos
+    Role = plugin.Role
+    streams = {
+        "flatParagraph": flatParagraph(textInfos),
+        "deeplyNested": deeplyNested(textInfos, Role),
+        "formatPerWord": formatPerWord(textInfos),
+        "headingRun": headingRun(textInfos, Role),
+    }
+    cases = []
+    for streamName, stream in streams.items():
+        def setupFields(stream=stream):
+            return copyFields(textInfos, stream)
+
+        def runControlTree(fields):
+            plugin.ControlTree(fields)
+        cases.append(Case(f"controlTree/{streamName}", setupFields, runControlTree))
+
+        def runControlTreeColumns(fields):
+            # Parent, depth and start columns are only built for tree queries.
+            plugin.ControlTree(fields).buildColumns()
+        cases.append(Case(f"controlTreeColumns/{streamName}", setupFields, runControlTreeColumns))
+
+        def runProcessors(fields):
+            controlTree = plugin.ControlTree(fields)
+            newCommands = plugin.collections.defaultdict(list)
+            skipIndices = set()
+            frenzyState = plugin.FrenzyState()
+            for func in [plugin.processHeadings, plugin.processBold]:
+                func(fields, newCommands, controlTree, frenzyState, textInfos.UNIT_LINE, plugin.OutputReason.CARET, skipIndices)
+        cases.append(Case(f"processors/{streamName}", setupFields, runProcessors))
+
+        def setupSplit(stream=stream):
+            fields = copyFields(textInfos, stream)
+            controlTree = plugin.ControlTree(fields)
+            newCommands = plugin.collections.defaultdict(list)
+            skipIndices = set()
+            frenzyState = plugin.FrenzyState()
+            for func in [plugin.processHeadings, plugin.processBold]:
+                func(fields, newCommands, controlTree, frenzyState, textInfos.UNIT_LINE, plugin.OutputReason.CARET, skipIndices)
+            info = SyntheticTextInfo(plugin, nvdaStubs.FakeObject(), fields)
+            return info, fields, newCommands, skipIndices
+
+        def runSplit(args):
+            for item in plugin.SplitFields(*args):
+                pass
+        cases.append(Case(f"SplitFields/{streamName}", setupSplit, runSplit))
+
+        def setupSpeech(stream=stream):
+            return SyntheticTextInfo(plugin, nvdaStubs.FakeObject(), stream)
+
+        def runSpeech(info):
+            for sequence in plugin.new_getTextInfoSpeech(info, useCache=True, unit=textInfos.UNIT_LINE, reason=plugin.OutputReason.CARET):
+                pass
+        cases.append(Case(f"getTextInfoSpeech/{streamName}", setupSpeech, runSpeech))
+
+        def setupSpeak(stream=stream):
+            # Sequences as spoken after getTextInfoSpeech, before new_speak optimizes them.
+            info = SyntheticTextInfo(plugin, nvdaStubs.FakeObject(), stream)
+            return [
+                list(sequence)
+                for sequence in plugin.new_getTextInfoSpeech(info, useCache=True, unit=textInfos.UNIT_LINE, reason=plugin.OutputReason.CARET)
+            ]
+
+        def runSpeak(sequences):
+            for sequence in sequences:
+                plugin.new_speak(sequence)
+
+        def describeSpeak(setupSpeak=setupSpeak):
+            sequences = setupSpeak()
+            before = sum(len(sequence) for sequence in sequences)
+            after = sum(len(plugin.optimizeSpeechSequence(sequence)) for sequence in sequences)
+            return f"{before} elements before new_speak, {after} after ({100 * (after - before) / max(1, before):+.0f}%)"
+        cases.append(Case(f"speak/{streamName}", setupSpeak, runSpeak, describeSpeak))
+    # Sequences stop at new_speak, nothing is spoken.
+    plugin.original_speak = lambda speechSequence, *args, **kwargs: None
+    return cases
+
+
+def calibrate(minTime):
+    # Fixed workload resembling the pipeline: attribute access, dict lookups and list building.
+    def workload():
+        d = {}
+        result = []
+        for i in range(2000):
+            d[i % 64] = d.get(i % 64, 0) + 1
+            result.append(str(i))
+        return result
+    iterations = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < minTime:
+        workload()
+        iterations += 1
+    return iterations / (time.perf_counter() - start)
+
+
+def measure(case, minTime):
+    elapsed = 0
+    iterations = 0
+    while elapsed < minTime:
+        args = case.setup()
+        startTime = time.perf_counter()
+        case.run(args)
+        elapsed += time.perf_counter() - startTime
+        iterations += 1
+    opsPerSec = iterations / elapsed
+    # Allocations are measured on a separate run, since tracemalloc slows everything down.
+    args = case.setup()
+    gc.collect()
+    tracemalloc.start()
+    blocksBefore = sys.getallocatedblocks()
+    case.run(args)
+    blocksAfter = sys.getallocatedblocks()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "opsPerSec": opsPerSec,
+        "peakBytes": peak,
+        "retainedBlocks": blocksAfter - blocksBefore,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the new baseline.")
+    parser.add_argument("--baseline", default=baselineFileName, help="Baseline file name.")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Minimum time in seconds to run each case and its calibration in one round.")
+    parser.add_argument("--rounds", type=int, default=7, help="Number of rounds, the median score is reported.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown or memory growth.")
+    parser.add_argument("-k", dest="keyword", default=None, help="Only run cases containing this substring.")
+    args = parser.parse_args()
+
+    plugin = nvdaStubs.loadPlugin()
+    cases = [case for case in makeCases(plugin) if not args.keyword or args.keyword in case.name]
+    rounds = {case.name: [] for case in cases}
+    # Rounds are interleaved across cases, so a burst of load on the machine hits one round of many cases
+    # rather than every round of one case.
+    for i in range(args.rounds):
+        for case in cases:
+            calibration = calibrate(args.min_time)
+            result = measure(case, args.min_time)
+            result["score"] = result["opsPerSec"] / calibration
+            rounds[case.name].append(result)
+    results = {}
+    for name, caseRounds in rounds.items():
+        results[name] = {
+            key: statistics.median(result[key] for result in caseRounds)
+            for key in caseRounds[0]
+        }
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = []
+    print(f"{'case':45} {'ops/s':>10} {'score':>9} {'vs base':>8} {'peak KiB':>9}")
+    for name, result in results.items():
+        line = f"{name:45} {result['opsPerSec']:10.1f} {result['score']:9.4f}"
+        base = baseline.get(name)
+        if base is not None:
+            ratio = result["score"] / base["score"]
+            line += f" {ratio:7.2f}x"
+            if ratio < 1 - args.tolerance:
+                regressions.append(f"{name}: throughput {ratio:.2f}x of baseline")
+            if result["peakBytes"] > base["peakBytes"] * (1 + args.tolerance) + 4096:
+                regressions.append(f"{name}: peak memory {result['peakBytes']} bytes, baseline {base['peakBytes']}")
+        else:
+            line += f" {'-':>8}"
+        line += f" {result['peakBytes'] / 1024:9.1f}"
+        print(line)
+    for case in cases:
+        if case.describe is not None:
+            print(f"{case.name:45} {case.describe()}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if regressions:
+        print("\nREGRESSIONS:")
+        for regression in regressions:
+            print("    " + regression)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Writes the sound catalog manifest addon/sounds/catalog.json.
+
+The manifest lists every built in sound with its duration, channels, rate, sample width and peak level,
+so that the add-on doesn't need to open and decode all wave files when the rule dialog is first shown.
+The add-on checks the manifest against the files on disk and rescans sounds if it is out of date.
+Run this after adding, removing or editing sounds.
+
+Usage:
+    python tools/buildSoundCatalog.py          # write the manifest
+    python tools/buildSoundCatalog.py --check  # exit with status 1 if the manifest is out of date
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import nvdaStubs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="Only check that the manifest is up to date.")
+    args = parser.parse_args()
+
+    plugin = nvdaStubs.loadPlugin()
+    soundsPath = plugin.getSoundsPath()
+    manifestPath = os.path.join(soundsPath, plugin.soundCatalogFileName)
+    catalog = plugin.scanSoundCatalog(soundsPath)
+    if args.check:
+        existing = plugin.loadSoundCatalogManifest(soundsPath)
+        if existing is None or existing.sounds != catalog.sounds:
+            print(f"{manifestPath} is out of date")
+            return 1
+        print(f"{manifestPath} is up to date, {len(catalog.sounds)} sounds")
+        return 0
+    with open(manifestPath, "w", encoding="utf-8", newline="\n") as f:
+        json.dump(catalog.toJson(), f, indent=1)
+        f.write("\n")
+    print(f"Wrote {len(catalog.sounds)} sounds to {manifestPath}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Checks speech sequence post-processing of earconFrenzy.py on random sequences.
+
+postProcessSynchronousCommands must produce the same sequence as the multi-pass implementation
+it replaced, followed by optimizeSpeechSequence. Sequences are compared structurally, as in capture files.
+optimizeSpeechSequence must not change what is spoken: a model of the synth renders the optimized
+and the original sequence into the same characters with the same prosody, the same breaks between
+other commands, and the same prosody state at the end.
+Key repeat throttling is disabled, as sequences are processed back to back.
+
+Usage:
+    python tools/checkSpeechSequences.py [--count N] [--seed N] [-v]
+"""
+
+import argparse
+import itertools
+import random
+import sys
+
+import nvdaStubs
+
+
+def referencePostProcess(plugin, speechSequence, symbolLevel):
+    """ postProcessSynchronousCommands and eloquenceFix before the single pass rewrite. """
+    speech = plugin.speech
+    language=speech.getCurrentLanguage()
+    speechSequence = [element for element in speechSequence
+        if not isinstance(element, str)
+        or not speech.isBlank(speech.processText(language,element,symbolLevel))
+    ]
+
+    newSequence = []
+    for (isSynchronous, values) in itertools.groupby(speechSequence, key=lambda x: isinstance(x, plugin.PpSynchronousCommand)):
+        if isSynchronous:
+            chain = plugin.PpChainCommand(list(values))
+            duration = chain.getDuration()
+            newSequence.append(chain)
+            newSequence.append(speech.commands.BreakCommand(duration))
+        else:
+            newSequence.extend(values)
+    nonEmpty = [element for element in newSequence
+        if  isinstance(element, str)
+        and not speech.isBlank(speech.processText(language,element,symbolLevel))
+    ]
+    if len(nonEmpty) > 0:
+        return newSequence
+    indicesToRemove = []
+    for i in range(1, len(newSequence)):
+        if  (
+            isinstance(newSequence[i], speech.commands.BreakCommand)
+            and isinstance(newSequence[i-1], plugin.PpChainCommand)
+        ):
+            indicesToRemove.append(i)
+    return [newSequence[i] for i in range(len(newSequence)) if i not in indicesToRemove]
+
+
+def render(plugin, speechSequence):
+    """
+    Models what a synth makes of a sequence: characters with the prosody in effect,
+    summed breaks between other commands, and prosody state at the end.
+    """
+    commands = plugin.speech.commands
+    events = []
+    prosody = {}
+    pendingBreak = 0
+    for element in speechSequence:
+        if isinstance(element, commands.BreakCommand):
+            pendingBreak += element.time
+            continue
+        if isinstance(element, plugin.prosodyCommandTypes):
+            prosody[type(element).__name__] = (element.offset, element.multiplier)
+            continue
+        if isinstance(element, str) and not element:
+            continue
+        if pendingBreak:
+            events.append(("break", pendingBreak))
+            pendingBreak = 0
+        if isinstance(element, str):
+            state = tuple(sorted(prosody.items()))
+            events.extend((c, state) for c in element)
+        else:
+            events.append(plugin.encodeCaptureValue(element))
+    if pendingBreak:
+        events.append(("break", pendingBreak))
+    return events, sorted(prosody.items())
+
+
+def makeSequence(plugin, rng):
+    commands = plugin.speech.commands
+    makers = [
+        lambda: rng.choice(["Hello", " world", "a", ",", "x y", "Bold text"]),
+        lambda: rng.choice(["", " ", "\n", "  "]),
+        lambda: plugin.PpBeepCommand(rng.choice([300, 500, 800]), rng.choice([10, 30, 50])),
+        lambda: commands.BreakCommand(rng.choice([0, 10, 30, 100])),
+        lambda: rng.choice([commands.PitchCommand, commands.VolumeCommand, commands.RateCommand])(
+            **rng.choice([{}, {"offset": 10}, {"offset": -10}, {"multiplier": 1.25}, {"multiplier": 1}])
+        ),
+        lambda: commands.IndexCommand(rng.randrange(100)),
+    ]
+    weights = [5, 2, 3, 2, 3, 1]
+    return [maker() for maker in rng.choices(makers, weights, k=rng.randrange(0, 30))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=5000, help="Number of random sequences.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("-v", dest="verbose", action="store_true", help="Print every failing sequence.")
+    args = parser.parse_args()
+
+    plugin = nvdaStubs.loadPlugin()
+    plugin.config.conf[plugin.pp]["rapidInterval"] = 0
+    plugin.refreshSettings()
+    symbolLevel = plugin.config.conf["speech"]["symbolLevel"]
+    rng = random.Random(args.seed)
+    failures = {"postProcess": 0, "optimize": 0}
+    inputLength = 0
+    optimizedLength = 0
+    for i in range(args.count):
+        sequence = makeSequence(plugin, rng)
+        expected = plugin.encodeCaptureValue(plugin.optimizeSpeechSequence(referencePostProcess(plugin, sequence, symbolLevel)))
+        actual = plugin.encodeCaptureValue(plugin.postProcessSynchronousCommands(sequence, symbolLevel))
+        if actual != expected:
+            failures["postProcess"] += 1
+            if args.verbose or failures["postProcess"] <= 3:
+                print(f"postProcessSynchronousCommands differs on {sequence!r}")
+        optimized = plugin.optimizeSpeechSequence(sequence)
+        inputLength += len(sequence)
+        optimizedLength += len(optimized)
+        if render(plugin, optimized) != render(plugin, sequence):
+            failures["optimize"] += 1
+            if args.verbose or failures["optimize"] <= 3:
+                print(f"optimizeSpeechSequence changes speech of {sequence!r}")
+    print(f"{args.count} sequences: {failures['postProcess']} post-processing mismatches, {failures['optimize']} optimization mismatches")
+    if inputLength:
+        print(f"Optimization removed {100 * (inputLength - optimizedLength) / inputLength:.0f}% of elements")
+    return 1 if any(failures.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,629 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Minimal stand-ins for NVDA modules, so that earconFrenzy.py can be imported and driven on plain CPython.
+Only what the add-on touches is modelled; everything GUI-related is a permissive dummy.
+Not shipped with the add-on.
+"""
+
+import builtins
+import enum
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+repoPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+pluginPath = os.path.join(repoPath, "addon", "globalPlugins", "earconFrenzy.py")
+
+
+class Dummy:
+    """Accepts any constructor arguments and attribute access; used for GUI classes and constants."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Dummy()
+
+    def __getattr__(self, name):
+        return Dummy()
+
+
+class PermissiveModule(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        # Capitalized names are used as base classes, others as functions or constants.
+        value = type(name, (Dummy,), {}) if name[:1].isupper() else Dummy()
+        setattr(self, name, value)
+        return value
+
+
+def makeModule(name, permissive=False, **attrs):
+    module = (PermissiveModule if permissive else types.ModuleType)(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+class OutputReason(enum.IntEnum):
+    FOCUS = 0
+    FOCUSENTERED = 1
+    MOUSE = 2
+    QUERY = 3
+    CHANGE = 4
+    MESSAGE = 5
+    SAYALL = 6
+    CARET = 7
+    ONLYCACHE = 8
+    QUICKNAV = 9
+
+
+# Modelled after controlTypes.Role; only names matter to the add-on.
+class Role(enum.IntEnum):
+    UNKNOWN = 0
+    WINDOW = 1
+    TITLEBAR = 2
+    PANE = 3
+    DIALOG = 4
+    CHECKBOX = 5
+    RADIOBUTTON = 6
+    STATICTEXT = 7
+    EDITABLETEXT = 8
+    BUTTON = 9
+    MENUBAR = 10
+    MENUITEM = 11
+    POPUPMENU = 12
+    COMBOBOX = 13
+    LIST = 14
+    LISTITEM = 15
+    GRAPHIC = 16
+    HELPBALLOON = 17
+    TOOLTIP = 18
+    LINK = 19
+    TREEVIEW = 20
+    TREEVIEWITEM = 21
+    TAB = 22
+    TABCONTROL = 23
+    SLIDER = 24
+    PROGRESSBAR = 25
+    SCROLLBAR = 26
+    STATUSBAR = 27
+    TABLE = 28
+    TABLECELL = 29
+    TABLECOLUMN = 30
+    TABLEROW = 31
+    TABLECOLUMNHEADER = 32
+    TABLEROWHEADER = 33
+    FRAME = 34
+    TOOLBAR = 35
+    DROPDOWNBUTTON = 36
+    CLOCK = 37
+    SEPARATOR = 38
+    FORM = 39
+    HEADING = 40
+    HEADING1 = 41
+    HEADING2 = 42
+    HEADING3 = 43
+    HEADING4 = 44
+    HEADING5 = 45
+    HEADING6 = 46
+    PARAGRAPH = 47
+    BLOCKQUOTE = 48
+    TABLEHEADER = 49
+    TABLEBODY = 50
+    TABLEFOOTER = 51
+    DOCUMENT = 52
+    ANIMATION = 53
+    APPLICATION = 54
+    BOX = 55
+    GROUPING = 56
+    PROPERTYPAGE = 57
+    CANVAS = 58
+    CAPTION = 59
+    CHECKMENUITEM = 60
+    DATEEDITOR = 61
+    ICON = 62
+    DIRECTORYPANE = 63
+    EMBEDDEDOBJECT = 64
+    ENDNOTE = 65
+    FOOTER = 66
+    FOOTNOTE = 67
+    GLASSPANE = 69
+    HEADER = 70
+    IMAGEMAP = 71
+    INPUTWINDOW = 72
+    LABEL = 73
+    NOTE = 74
+    PAGE = 75
+    RADIOMENUITEM = 76
+    LAYEREDPANE = 77
+    REDUNDANTOBJECT = 78
+    ROOTPANE = 79
+    EDITBAR = 80
+    TERMINAL = 82
+    RICHEDIT = 83
+    RULER = 84
+    SCROLLPANE = 85
+    SECTION = 86
+    SHAPE = 87
+    SPLITPANE = 88
+    VIEWPORT = 89
+    TEAROFFMENU = 90
+    TEXTFRAME = 91
+    TOGGLEBUTTON = 92
+    BORDER = 93
+    CARET = 94
+    CHARACTER = 95
+    CHART = 96
+    CURSOR = 97
+    DIAGRAM = 98
+    DIAL = 99
+    DROPLIST = 100
+    SPLITBUTTON = 101
+    MENUBUTTON = 102
+    DROPDOWNBUTTONGRID = 103
+    MATH = 104
+    EQUATION = 105
+    GRIP = 106
+    HOTKEYFIELD = 107
+    INDICATOR = 108
+    SPINBUTTON = 109
+    SOUND = 110
+    WHITESPACE = 111
+    TREEVIEWBUTTON = 112
+    IPADDRESS = 113
+    DESKTOPICON = 114
+    INTERNALFRAME = 116
+    DESKTOPPANE = 117
+    OPTIONPANE = 118
+    COLORCHOOSER = 119
+    FILECHOOSER = 120
+    FILLER = 121
+    MENU = 122
+    PANEL = 123
+    PASSWORDEDIT = 124
+    FONTCHOOSER = 125
+    LINE = 126
+    FONTNAME = 127
+    FONTSIZE = 128
+    BOLD = 129
+    ITALIC = 130
+    UNDERLINE = 131
+    FGCOLOR = 132
+    BGCOLOR = 133
+    SUPERSCRIPT = 134
+    SUBSCRIPT = 135
+    STYLE = 136
+    INDENT = 137
+    ALIGNMENT = 138
+    ALERT = 139
+    DATAGRID = 140
+    DATAITEM = 141
+    HEADERITEM = 142
+    THUMB = 143
+    CALENDAR = 144
+    VIDEO = 145
+    AUDIO = 146
+    CHARTELEMENT = 147
+    DELETED_CONTENT = 148
+    INSERTED_CONTENT = 149
+    LANDMARK = 150
+    ARTICLE = 151
+    REGION = 152
+    FIGURE = 153
+    MARKED_CONTENT = 154
+
+
+# Modelled after controlTypes.State; only names matter to the add-on.
+class State(enum.IntEnum):
+    UNAVAILABLE = 0X1
+    FOCUSED = 0X2
+    SELECTED = 0X4
+    BUSY = 0X8
+    PRESSED = 0X10
+    CHECKED = 0X20
+    HALFCHECKED = 0X40
+    READONLY = 0X80
+    EXPANDED = 0X100
+    COLLAPSED = 0X200
+    INVISIBLE = 0X400
+    VISITED = 0X800
+    LINKED = 0X1000
+    HASPOPUP = 0X2000
+    PROTECTED = 0X4000
+    REQUIRED = 0X8000
+    DEFUNCT = 0X10000
+    INVALID_ENTRY = 0X20000
+    MODAL = 0X40000
+    AUTOCOMPLETE = 0x80000
+    MULTILINE = 0X100000
+    ICONIFIED = 0x200000
+    OFFSCREEN = 0x400000
+    SELECTABLE = 0x800000
+    FOCUSABLE = 0x1000000
+    CLICKABLE = 0x2000000
+    EDITABLE = 0x4000000
+    CHECKABLE = 0x8000000
+    DRAGGABLE = 0x10000000
+    DRAGGING = 0x20000000
+    DROPTARGET = 0x40000000
+    SORTED = 0x80000000
+    SORTED_ASCENDING = 0x100000000
+    SORTED_DESCENDING = 0x200000000
+    HASLONGDESC = 0x400000000
+    PINNED = 0x800000000
+    HASFORMULA = 0x1000000000
+    HASCOMMENT = 0x2000000000
+    OBSCURED = 0x4000000000
+    CROPPED = 0x8000000000
+    OVERFLOWING = 0x10000000000
+    UNLOCKED = 0x20000000000
+    HAS_ARIA_DETAILS = 0x40000000000
+    HASNOTE = 0x80000000000
+
+
+def processAndLabelStates(role, states, reason, positiveStates, negativeStates, positiveStateLabelDict=None, negativeStateLabelDict=None):
+    positiveStateLabelDict = positiveStateLabelDict or {}
+    negativeStateLabelDict = negativeStateLabelDict or {}
+    result = [positiveStateLabelDict.get(state, state.name.lower()) for state in sorted(positiveStates or ())]
+    result += [negativeStateLabelDict.get(state, "not " + state.name.lower()) for state in sorted(negativeStates or ())]
+    return result
+
+
+class SpeechCommand:
+    pass
+
+
+class BaseCallbackCommand(SpeechCommand):
+    def run(self):
+        pass
+
+
+class BreakCommand(SpeechCommand):
+    def __init__(self, time=0):
+        self.time = time
+
+    def __repr__(self):
+        return f"BreakCommand(time={self.time})"
+
+
+class SynthParamCommand(SpeechCommand):
+    def __init__(self, offset=0, multiplier=1):
+        self.offset = offset
+        self.multiplier = multiplier
+        self.isDefault = offset == 0 and multiplier == 1
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.offset == other.offset and self.multiplier == other.multiplier
+
+    def __hash__(self):
+        return hash((type(self), self.offset, self.multiplier))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(offset={self.offset}, multiplier={self.multiplier})"
+
+
+class PitchCommand(SynthParamCommand):
+    pass
+
+
+class VolumeCommand(SynthParamCommand):
+    pass
+
+
+class RateCommand(SynthParamCommand):
+    pass
+
+
+class IndexCommand(SpeechCommand):
+    def __init__(self, index):
+        self.index = index
+
+
+class SpeakTextInfoState:
+    def __init__(self, obj):
+        if isinstance(obj, SpeakTextInfoState):
+            oldState = obj
+            self.objRef = obj.objRef
+        else:
+            self.objRef = obj
+            oldState = getattr(obj, '_speakTextInfoState', None)
+        self.formatFieldAttributesCache = oldState.formatFieldAttributesCache if oldState else {}
+        self.controlFieldStackCache = list(oldState.controlFieldStackCache) if oldState else []
+
+    def updateObj(self):
+        self.objRef._speakTextInfoState = self.copy()
+
+    def copy(self):
+        return SpeakTextInfoState(self)
+
+
+def isBlank(text):
+    return not text or text.isspace()
+
+
+def processText(locale, text, symbolLevel, **kwargs):
+    return text.strip()
+
+
+def getTextInfoSpeech(info, useCache=True, formatConfig=None, unit=None, reason=OutputReason.QUERY, _prefixSpeechCommand=None, onlyInitialFields=False, suppressBlanks=False):
+    """Cheap model of NVDA's getTextInfoSpeech: speaks strings and control roles."""
+    sequence = []
+    if _prefixSpeechCommand is not None:
+        sequence.append(_prefixSpeechCommand)
+    for field in info.getTextWithFields(formatConfig):
+        if isinstance(field, str):
+            sequence.append(field)
+        elif isinstance(field, FieldCommand) and field.command == "controlStart":
+            role = field.field.get('role')
+            if role is not None:
+                sequence.append(Role(role).name.lower())
+    if useCache:
+        state = useCache if isinstance(useCache, SpeakTextInfoState) else SpeakTextInfoState(info.obj)
+        state.formatFieldAttributesCache = {}
+        if not isinstance(useCache, SpeakTextInfoState):
+            state.updateObj()
+    yield sequence
+    return True
+
+
+def getPropertiesSpeech(reason=OutputReason.QUERY, **propertyValues):
+    result = []
+    roleText = propertyValues.get('roleText')
+    role = propertyValues.get('role')
+    if roleText is not None:
+        result.append(roleText)
+    elif role is not None:
+        result.append(Role(role).name.lower())
+    states = propertyValues.get('states')
+    if states is not None:
+        result.extend(sys.modules['controlTypes'].processAndLabelStates(
+            propertyValues.get('_role', role), propertyValues.get('_states', states), reason, states, propertyValues.get('negativeStates', set())
+        ))
+    return result
+
+
+spokenSequences = []
+def speak(sequence, *args, **kwargs):
+    spokenSequences.append(list(sequence))
+
+
+def cancelSpeech():
+    pass
+
+
+UNIT_CHARACTER = "character"
+UNIT_WORD = "word"
+UNIT_LINE = "line"
+UNIT_SENTENCE = "sentence"
+UNIT_PARAGRAPH = "paragraph"
+UNIT_STORY = "story"
+
+
+class FieldCommand:
+    __slots__ = ("command", "field")
+
+    def __init__(self, command, field):
+        if command not in ("controlStart", "controlEnd", "formatChange"):
+            raise ValueError("Unknown command: %s" % command)
+        self.command = command
+        self.field = field
+
+    def __repr__(self):
+        return "FieldCommand %s with %s" % (self.command, self.field)
+
+
+class TextInfo:
+    def __init__(self, obj, position):
+        self.obj = obj
+        self.basePosition = position
+
+
+class FakeObject:
+    """Stands in for an NVDAObject; only used as a carrier of _speakTextInfoState."""
+    pass
+
+
+class ConfigSection(dict):
+    def copy(self):
+        return ConfigSection(self)
+
+
+class Config:
+    def __init__(self):
+        self.spec = {}
+        self.conf = {}
+        self.profileHandlers = []
+
+    def __getitem__(self, key):
+        if key not in self.conf:
+            self.conf[key] = ConfigSection(self._defaults(key))
+        return self.conf[key]
+
+    def __setitem__(self, key, value):
+        self.conf[key] = value
+
+    def _defaults(self, key):
+        result = {}
+        for name, spec in self.spec.get(key, {}).items():
+            value = spec.split("default=")[1].split(",")[0].split(")")[0].strip().strip('"').strip("'")
+            if spec.startswith("boolean"):
+                result[name] = value == "True"
+            elif spec.startswith("integer"):
+                result[name] = int(value)
+            elif spec.startswith("float"):
+                result[name] = float(value)
+            else:
+                result[name] = value
+        return result
+
+
+class WavePlayer:
+    """Discards audio; only counts what it was fed."""
+    def __init__(self, channels, samplesPerSec, bitsPerSample, outputDevice=None, wantDucking=True, **kwargs):
+        self.channels = channels
+        self.samplesPerSec = samplesPerSec
+        self.bitsPerSample = bitsPerSample
+        self.fedBytes = 0
+
+    def feed(self, data, *args, **kwargs):
+        self.fedBytes += len(data)
+
+    def idle(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def pause(self, switch):
+        pass
+
+    def close(self):
+        pass
+
+
+class Log:
+    def __init__(self):
+        self.errors = []
+
+    def error(self, *args, **kwargs):
+        self.errors.append(args)
+
+    def warning(self, *args, **kwargs):
+        pass
+
+    def info(self, *args, **kwargs):
+        pass
+
+    def debug(self, *args, **kwargs):
+        pass
+
+    def debugWarning(self, *args, **kwargs):
+        pass
+
+    def exception(self, *args, **kwargs):
+        self.errors.append(args)
+
+
+def script(**kwargs):
+    def decorator(func):
+        return func
+    return decorator
+
+
+def generateBeep(buf, hz, length, left=50, right=50):
+    size = int(length * 44100 / 1000) * 4
+    if buf is not None:
+        buf.raw = bytes(size)
+    return size
+
+
+def installStubs(configPath=None):
+    """Registers stub modules in sys.modules. Safe to call more than once."""
+    if "speech" in sys.modules and getattr(sys.modules["speech"], "isEarconFrenzyStub", False):
+        return
+    if configPath is None:
+        configPath = tempfile.mkdtemp(prefix="earconFrenzy")
+    builtins._ = lambda s: s
+    builtins.ngettext = lambda singular, plural, n: singular if n == 1 else plural
+    makeModule("addonHandler", initTranslation=lambda: None)
+    makeModule("api", permissive=True)
+    config = Config()
+    config["speech"] = ConfigSection(outputDevice="default", symbolLevel=100)
+    config["documentFormatting"] = ConfigSection(reportFontAttributes=True, reportHeadings=True)
+    makeModule(
+        "config",
+        conf=config,
+        post_configProfileSwitch=Dummy(),
+        post_configSave=Dummy(),
+        post_configReset=Dummy(),
+    )
+    makeModule(
+        "controlTypes",
+        OutputReason=OutputReason,
+        Role=Role,
+        State=State,
+        processAndLabelStates=processAndLabelStates,
+    )
+    makeModule("core", permissive=True)
+    makeModule("globalPluginHandler", GlobalPlugin=type("GlobalPlugin", (Dummy,), {}))
+    makeModule("globalVars", appArgs=types.SimpleNamespace(configPath=configPath))
+    gui = makeModule("gui", permissive=True)
+    gui.guiHelper = makeModule("gui.guiHelper", permissive=True)
+    gui.nvdaControls = makeModule("gui.nvdaControls", permissive=True)
+    gui.settingsDialogs = makeModule("gui.settingsDialogs", permissive=True)
+    makeModule("logHandler", log=Log())
+    makeModule("NVDAHelper", generateBeep=generateBeep)
+    nvdaObjects = makeModule("NVDAObjects", permissive=True)
+    nvdaObjects.window = makeModule("NVDAObjects.window", permissive=True)
+    nvdaObjects.window.winword = makeModule("NVDAObjects.window.winword", permissive=True)
+    makeModule("nvwave", WavePlayer=WavePlayer, playWaveFile=lambda *args, **kwargs: None)
+    makeModule("scriptHandler", script=script, willSayAllResume=lambda gesture: False)
+    commands = makeModule(
+        "speech.commands",
+        SpeechCommand=SpeechCommand,
+        BaseCallbackCommand=BaseCallbackCommand,
+        BreakCommand=BreakCommand,
+        PitchCommand=PitchCommand,
+        VolumeCommand=VolumeCommand,
+        RateCommand=RateCommand,
+        IndexCommand=IndexCommand,
+    )
+    speechSpeech = makeModule(
+        "speech.speech",
+        SpeakTextInfoState=SpeakTextInfoState,
+        getTextInfoSpeech=getTextInfoSpeech,
+        getPropertiesSpeech=getPropertiesSpeech,
+        speak=speak,
+    )
+    makeModule(
+        "speech",
+        commands=commands,
+        speech=speechSpeech,
+        isBlank=isBlank,
+        processText=processText,
+        getCurrentLanguage=lambda: "en",
+        speak=speak,
+        cancelSpeech=cancelSpeech,
+        spokenSequences=spokenSequences,
+        isEarconFrenzyStub=True,
+    )
+    makeModule(
+        "textInfos",
+        TextInfo=TextInfo,
+        FieldCommand=FieldCommand,
+        UNIT_CHARACTER=UNIT_CHARACTER,
+        UNIT_WORD=UNIT_WORD,
+        UNIT_LINE=UNIT_LINE,
+        UNIT_SENTENCE=UNIT_SENTENCE,
+        UNIT_PARAGRAPH=UNIT_PARAGRAPH,
+        UNIT_STORY=UNIT_STORY,
+    )
+    makeModule("tones", SAMPLE_RATE=44100, beep=lambda *args, **kwargs: None, initialize=lambda: None)
+    makeModule("ui", permissive=True)
+    makeModule("wx", permissive=True)
+
+
+def loadPlugin(configPath=None):
+    """Installs stubs and imports earconFrenzy.py, returning the module."""
+    installStubs(configPath)
+    if "earconFrenzy" in sys.modules:
+        return sys.modules["earconFrenzy"]
+    spec = importlib.util.spec_from_file_location("earconFrenzy", pluginPath)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["earconFrenzy"] = module
+    spec.loader.exec_module(module)
+    # Emulate GlobalPlugin.injectSpeechInterceptor without touching GUI.
+    speechModule = sys.modules["speech"]
+    module.original_getTextInfoSpeech = speechModule.speech.getTextInfoSpeech
+    module.original_getPropertiesSpeech = speechModule.speech.getPropertiesSpeech
+    module.original_processAndLabelStates = sys.modules["controlTypes"].processAndLabelStates
+    module.originalSpeechCancel = speechModule.cancelSpeech
+    module.originalTonesInitialize = sys.modules["tones"].initialize
+    return module
@@ -0,0 +1,160 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Losslessly compresses built in sounds for the add-on bundle.
+
+Each 16-bit wave file is stored as a .efz file: stereo channels are stored as left channel and
+right minus left, or just once when identical, as zlib compressed differences between consecutive samples.
+Files that don't compress, or aren't 16-bit, are kept as wave files.
+The sound catalog is rewritten with the sizes of packed files.
+The format is decoded by decodeCompressedSound in earconFrenzy.py; the constants below must match it.
+sconstruct packs sounds this way when building the add-on, and leaves the source tree unchanged.
+
+Usage:
+    python tools/packSounds.py OUTPUT_DIR           # write packed copy of addon/sounds to OUTPUT_DIR
+    python tools/packSounds.py OUTPUT_DIR --verify  # also decode every packed file and compare with the original
+"""
+
+import argparse
+import array
+import io
+import itertools
+import json
+import os
+import struct
+import sys
+import wave
+import zlib
+
+compressedSoundExtension = ".efz"
+compressedSoundMagic = b"EFZ1"
+compressedSoundHeader = struct.Struct("<4sHIBBI")
+compressedSoundChannelHeader = struct.Struct("<cI")
+compressedSoundDualMono = 1
+compressedSoundSide = 2
+soundCatalogFileName = "catalog.json"
+
+soundsPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "addon", "sounds")
+
+
+def encodeChannel(samples):
+    deltas = array.array("i", itertools.islice(samples, 1))
+    deltas.extend(b - a for a, b in zip(samples, itertools.islice(samples, 1, None)))
+    if all(-32768 <= d <= 32767 for d in deltas):
+        deltas = array.array("h", deltas)
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    data = zlib.compress(deltas.tobytes(), 9)
+    return compressedSoundChannelHeader.pack(deltas.typecode.encode("ascii"), len(data)) + data
+
+
+def compressWave(fileName):
+    """Returns compressed bytes of a wave file, or None if it can't be compressed."""
+    with wave.open(fileName, "rb") as f:
+        channels = f.getnchannels()
+        rate = f.getframerate()
+        sampleWidth = f.getsampwidth()
+        frames = f.readframes(f.getnframes())
+    if sampleWidth != 2 or channels not in (1, 2):
+        return None
+    samples = array.array("h", frames)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    frameCount = len(samples) // channels
+    stored = [samples[i::channels] for i in range(channels)]
+    flags = 0
+    if channels == 2:
+        if stored[0] == stored[1]:
+            flags = compressedSoundDualMono
+            stored = stored[:1]
+        else:
+            flags = compressedSoundSide
+            stored[1] = array.array("i", (right - left for left, right in zip(stored[0], stored[1])))
+    header = compressedSoundHeader.pack(compressedSoundMagic, channels, rate, sampleWidth, flags, frameCount)
+    return header + b"".join(encodeChannel(channel) for channel in stored)
+
+
+def iterPackedSounds(sourcePath, prefix=""):
+    """
+    Yields (relative path, bytes) of every file of a packed copy of sourcePath, catalog included.
+    Relative paths are prefixed with prefix.
+    """
+    sizes = {}
+    for category in sorted(os.listdir(sourcePath)):
+        categoryPath = os.path.join(sourcePath, category)
+        if not os.path.isdir(categoryPath):
+            continue
+        for fileName in sorted(os.listdir(categoryPath)):
+            path = os.path.join(categoryPath, fileName)
+            with open(path, "rb") as f:
+                data = f.read()
+            name, ext = os.path.splitext(fileName)
+            if ext.lower() == ".wav":
+                packed = compressWave(path)
+                if packed is not None and len(packed) < len(data):
+                    fileName = name + compressedSoundExtension
+                    data = packed
+                sizes[f"{category}/{name}.wav"] = len(data)
+            yield os.path.join(prefix, category, fileName), data
+    catalogPath = os.path.join(sourcePath, soundCatalogFileName)
+    if os.path.exists(catalogPath):
+        with open(catalogPath, "r", encoding="utf-8") as f:
+            catalog = json.load(f)
+        for entry in catalog["sounds"]:
+            if entry["name"] in sizes:
+                entry["size"] = sizes[entry["name"]]
+        output = io.StringIO()
+        json.dump(catalog, output, indent=1)
+        output.write("\n")
+        yield os.path.join(prefix, soundCatalogFileName), output.getvalue().encode("utf-8")
+
+
+def verify(outputPath):
+    import nvdaStubs
+    plugin = nvdaStubs.loadPlugin()
+    failed = 0
+    for category, fileName, path in plugin.listSoundFiles(outputPath):
+        if not path.endswith(compressedSoundExtension):
+            continue
+        decoded = plugin.readDecodedWave(path)
+        with wave.open(os.path.join(soundsPath, category, fileName), "rb") as f:
+            expected = (f.getnchannels(), f.getframerate(), f.getsampwidth(), f.readframes(f.getnframes()))
+        if tuple(decoded) != expected:
+            print(f"{category}/{fileName}: decoded sound differs from original")
+            failed += 1
+    if plugin.loadSoundCatalogManifest(outputPath) is None:
+        print("Packed sound catalog doesn't match packed files")
+        failed += 1
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Directory to write packed sounds to.")
+    parser.add_argument("--verify", action="store_true", help="Decode packed files with the add-on and compare with originals.")
+    args = parser.parse_args()
+
+    originalSize = 0
+    packedSize = 0
+    for relativePath, data in iterPackedSounds(soundsPath):
+        path = os.path.join(args.output, relativePath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        packedSize += len(data)
+    for dirName, dirNames, fileNames in os.walk(soundsPath):
+        originalSize += sum(os.path.getsize(os.path.join(dirName, fileName)) for fileName in fileNames)
+    print(f"Packed {originalSize / 2**20:.1f} MiB of sounds into {packedSize / 2**20:.1f} MiB")
+    if args.verify:
+        failed = verify(args.output)
+        print(f"{failed} files failed verification")
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Replays capture files recorded by the "Start or stop capturing" script of earconFrenzy.py.
+
+Each captured getTextInfoSpeech call is fed back through new_getTextInfoSpeech with the same
+fields, unit, reason and initial frenzy state. The original NVDA function is replaced by
+a player of the captured chunks, so we also check that the fields passed to it are unchanged.
+Each captured speech sequence is fed back through postProcessSynchronousCommands.
+Output is compared structurally with what was captured, and our own processing time is compared
+with the captured time.
+
+Usage:
+    python tools/replayCaptures.py CAPTURE [CAPTURE ...] [-v] [--repeat N]
+"""
+
+import argparse
+import collections
+import gzip
+import json
+import os
+import sys
+import time
+
+import nvdaStubs
+
+
+class Opaque:
+    """Stands in for a value captured as its repr."""
+    def __init__(self, text):
+        self.text = text
+
+    def __repr__(self):
+        return self.text
+
+
+class Decoder:
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.enums = {
+            "Role": plugin.Role,
+            "State": plugin.State,
+            "OutputReason": plugin.OutputReason,
+        }
+        self.commandClasses = {}
+        self.commandCache = {}
+
+    def decode(self, value):
+        if isinstance(value, list):
+            return [self.decode(v) for v in value]
+        if not isinstance(value, dict):
+            return value
+        if len(value) == 1:
+            (key, v), = value.items()
+            if key == "$enum":
+                typeName, name = v
+                enumType = self.enums.get(typeName)
+                if enumType is not None and name in enumType.__members__:
+                    return enumType[name]
+                return Opaque(f"<{typeName}.{name}>")
+            if key == "$set":
+                return set(self.decode(v))
+            if key == "$items":
+                return {self.decode(k): self.decode(x) for k, x in v}
+            if key == "$field":
+                command, field = v
+                return self.plugin.textInfos.FieldCommand(command, self.decode(field))
+            if key == "$command":
+                name, attrs = v
+                return self.decodeCommand(name, attrs)
+            if key == "$repr":
+                return Opaque(v)
+        return {k: self.decode(v) for k, v in value.items()}
+
+    def decodeCommand(self, name, attrs):
+        plugin = self.plugin
+        cls = getattr(plugin, name, None)
+        if isinstance(cls, type) and hasattr(cls, "captureFields"):
+            key = json.dumps([name, attrs], sort_keys=True)
+            if key not in self.commandCache:
+                kwargs = self.decode(attrs)
+                fileName = kwargs.get("fileName")
+                if isinstance(fileName, str) and fileName.startswith(plugin.soundsPathPrefix):
+                    kwargs["fileName"] = os.path.join(plugin.getSoundsPath(), *fileName[len(plugin.soundsPathPrefix):].split("/"))
+                self.commandCache[key] = cls(**kwargs)
+            return self.commandCache[key]
+        cls = getattr(plugin.speech.commands, name, None)
+        if not isinstance(cls, type):
+            # Command not modelled by the stubs: recreate a class with the same name.
+            if name not in self.commandClasses:
+                self.commandClasses[name] = type(name, (plugin.speech.commands.SpeechCommand,), {})
+            cls = self.commandClasses[name]
+        command = cls.__new__(cls)
+        command.__dict__.update(self.decode(attrs))
+        return command
+
+
+class CapturedTextInfo:
+    def __init__(self, plugin, fields):
+        self.obj = nvdaStubs.FakeObject()
+        self.fields = fields
+
+    def getTextWithFields(self, formatConfig=None):
+        return self.fields
+
+
+class ChunkPlayer:
+    """Replaces original getTextInfoSpeech, replaying captured outputs chunk by chunk."""
+    def __init__(self, plugin, decoder, chunks):
+        self.plugin = plugin
+        self.decoder = decoder
+        self.chunks = list(chunks)
+        self.index = 0
+        self.mismatches = []
+        self.elapsed = 0.0
+
+    def __call__(self, info, *args, **kwargs):
+        startTime = time.perf_counter()
+        if self.index >= len(self.chunks):
+            self.mismatches.append(f"unexpected extra chunk #{self.index}")
+            return
+        chunk = self.chunks[self.index]
+        fields = self.plugin.encodeCaptureValue(info.getTextWithFields())
+        if fields != chunk["fields"]:
+            self.mismatches.append(f"chunk #{self.index} fields differ: {describeDifference(chunk['fields'], fields)}")
+        self.index += 1
+        output = self.decoder.decode(chunk["output"])
+        # Time spent here stands in for NVDA and is excluded from our own time.
+        self.elapsed += time.perf_counter() - startTime
+        yield from output
+
+
+def describeDifference(expected, actual):
+    if isinstance(expected, list) and isinstance(actual, list):
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            if e != a:
+                return f"at [{i}]: expected {json.dumps(e)}, got {json.dumps(a)}"
+        return f"length: expected {len(expected)}, got {len(actual)}"
+    return f"expected {json.dumps(expected)}, got {json.dumps(actual)}"
+
+
+def readCapture(fileName):
+    with gzip.open(fileName, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        records = [json.loads(line) for line in f if line.strip()]
+    return header, records
+
+
+def replayTextInfo(plugin, decoder, record):
+    fields = decoder.decode(record["fields"])
+    player = ChunkPlayer(plugin, decoder, record["chunks"])
+    plugin.original_getTextInfoSpeech = player
+    state = plugin.SpeakTextInfoState(nvdaStubs.FakeObject())
+    frenzyState = plugin.FrenzyState()
+    for name, value in record["frenzyState"].items():
+        if name in plugin.FrenzyState.fieldNames:
+            setattr(frenzyState, name, value)
+    state.formatFieldAttributesCache[plugin.frenzyStateKey] = frenzyState
+    reason = decoder.decode(record["reason"])
+    startTime = time.perf_counter()
+    output = list(plugin.new_getTextInfoSpeech(
+        CapturedTextInfo(plugin, fields),
+        useCache=state,
+        unit=record["unit"],
+        reason=reason,
+    ))
+    elapsed = time.perf_counter() - startTime - player.elapsed
+    mismatches = player.mismatches
+    if player.index != len(player.chunks):
+        mismatches.append(f"only {player.index} of {len(player.chunks)} chunks requested")
+    encoded = plugin.encodeCaptureValue(output)
+    if encoded != record["output"]:
+        mismatches.append("output differs " + describeDifference(record["output"], encoded))
+    return elapsed * 1000, mismatches
+
+
+def replaySequence(plugin, decoder, record):
+    sequence = decoder.decode(record["input"])
+    startTime = time.perf_counter()
+    output = plugin.postProcessSynchronousCommands(sequence, record["symbolLevel"])
+    elapsed = time.perf_counter() - startTime
+    mismatches = []
+    encoded = plugin.encodeCaptureValue(output)
+    if encoded != record["output"]:
+        mismatches.append("output differs " + describeDifference(record["output"], encoded))
+    return elapsed * 1000, mismatches
+
+
+replayers = {
+    "textInfo": replayTextInfo,
+    "sequence": replaySequence,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captures", nargs="+", help="Capture files (.jsonl.gz).")
+    parser.add_argument("-v", dest="verbose", action="store_true", help="Print every mismatch.")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay each record this many times for timing.")
+    args = parser.parse_args()
+
+    plugin = nvdaStubs.loadPlugin()
+    # Captures carry no timing, so records replayed back to back must not count as key repeat.
+    plugin.config.conf[plugin.pp]["rapidInterval"] = 0
+    plugin.refreshSettings()
+    originalGetTextInfoSpeech = plugin.original_getTextInfoSpeech
+    decoder = Decoder(plugin)
+    failed = 0
+    totals = collections.defaultdict(lambda: [0, 0.0, 0.0])
+    for fileName in args.captures:
+        header, records = readCapture(fileName)
+        if header.get("format") != plugin.captureFormat:
+            print(f"{fileName}: not a capture file")
+            return 2
+        if header.get("version") != plugin.captureFormatVersion:
+            print(f"{fileName}: capture format version {header.get('version')}, expected {plugin.captureFormatVersion}")
+            return 2
+        for i, record in enumerate(records):
+            replayer = replayers.get(record.get("type"))
+            if replayer is None:
+                continue
+            best = None
+            for repeat in range(args.repeat):
+                elapsed, mismatches = replayer(plugin, decoder, record)
+                best = elapsed if best is None else min(best, elapsed)
+            plugin.original_getTextInfoSpeech = originalGetTextInfoSpeech
+            total = totals[record["type"]]
+            total[0] += 1
+            total[1] += record.get("ownMs", 0)
+            total[2] += best
+            if mismatches:
+                failed += 1
+                if args.verbose or failed <= 10:
+                    print(f"{fileName} record {i} ({record['type']}):")
+                    for mismatch in mismatches:
+                        print("    " + mismatch)
+    for recordType, (n, capturedMs, replayedMs) in totals.items():
+        ratio = replayedMs / capturedMs if capturedMs > 0 else float("nan")
+        print(f"{recordType}: {n} records, captured {capturedMs:.1f} ms, replayed {replayedMs:.1f} ms ({ratio:.2f}x)")
+    print(f"{failed} records with mismatches")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+# -*- coding: UTF-8 -*-
+#A part of the Earcon Frenzy addon for NVDA
+#Copyright (C) 2022 Tony Malykh
+#This file is covered by the GNU General Public License.
+#See the file COPYING.txt for more details.
+
+"""
+Deterministic simulation of earcon scheduling in earconFrenzy.py.
+
+PpChainCommand, PpWaveFileCommand and the thread pool run on real threads,
+and bare earcons are run by a pool thread standing in for the speech manager,
+but only one of them runs at a time and all of them sleep on a virtual clock,
+so a scenario produces the same timeline on every run and on every machine.
+Wave players are replaced by recorders that log what would have been audible and when.
+
+For each scenario we report, in milliseconds:
+    start error - actual minus scheduled start time of each earcon (mean and max), and jitter (max - min);
+    gaps - silence between consecutive earcons of one chain;
+    overlap - time during which more than one earcon is audible;
+    leakage - audio heard after speech was cancelled;
+    backlog - audio heard after the last utterance started.
+Earcon throttling policies of the add-on apply with their default settings unless a scenario changes them.
+NVDA cancels speech on every navigation gesture, so navigation is simulated as a cancellation.
+
+Usage:
+    python tools/simEarconTiming.py [--json FILE]
+"""
+
+import argparse
+import collections
+import functools
+import heapq
+import json
+import os
+import sys
+import threading
+
+import nvdaStubs
+
+
+class VirtualClock:
+    """
+    Discrete event clock.
+    Simulated threads block in sleep(); the driver advances time to the earliest wake-up
+    only once every simulated thread is blocked, so execution is deterministic.
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.cond = threading.Condition()
+        self.active = 0
+        self.sleepers = []
+        self.seq = 0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.cond:
+            ticket = [False]
+            self.seq += 1
+            heapq.heappush(self.sleepers, (self.now + max(0, seconds), self.seq, ticket))
+            self.active -= 1
+            self.cond.notify_all()
+            while not ticket[0]:
+                self.cond.wait()
+
+    def runUntil(self, until=None):
+        """Advances virtual time up to until, or until nothing is left to do if until is None."""
+        with self.cond:
+            while True:
+                while self.active > 0:
+                    self.cond.wait()
+                if not self.sleepers or (until is not None and self.sleepers[0][0] > until):
+                    if until is not None:
+                        self.now = max(self.now, until)
+                    return
+                wakeTime, seq, ticket = heapq.heappop(self.sleepers)
+                self.now = max(self.now, wakeTime)
+                ticket[0] = True
+                self.active += 1
+                self.cond.notify_all()
+
+
+class SimulatedWorker(threading.Thread):
+    def __init__(self, pool):
+        super().__init__(daemon=True)
+        self.pool = pool
+        self.task = None
+
+    def run(self):
+        clock = self.pool.clock
+        while True:
+            with clock.cond:
+                if self.pool.pending:
+                    task = self.pool.pending.popleft()
+                else:
+                    self.pool.idle.append(self)
+                    clock.active -= 1
+                    clock.cond.notify_all()
+                    while self.task is None:
+                        clock.cond.wait()
+                    task, self.task = self.task, None
+            func, args, kargs = task
+            try:
+                func(*args, **kargs)
+            except Exception as e:
+                self.pool.errors.append(e)
+
+
+class SimulatedThreadPool:
+    """Same interface as earconFrenzy.ThreadPool, but workers are driven by a VirtualClock."""
+    def __init__(self, clock, numThreads):
+        self.clock = clock
+        self.pending = collections.deque()
+        self.idle = []
+        self.errors = []
+        self.maxPending = 0
+        with clock.cond:
+            clock.active += numThreads
+        for i in range(numThreads):
+            SimulatedWorker(self).start()
+        clock.runUntil(0)
+
+    def add_task(self, func, *args, **kargs):
+        with self.clock.cond:
+            task = (func, args, kargs)
+            if self.idle:
+                worker = self.idle.pop(0)
+                worker.task = task
+                self.clock.active += 1
+                self.clock.cond.notify_all()
+            else:
+                self.pending.append(task)
+                self.maxPending = max(self.maxPending, len(self.pending))
+
+
+Segment = collections.namedtuple("Segment", "label start end")
+
+class RecordingWavePlayer:
+    """Pretends to play audio in virtual time and records audible segments."""
+    def __init__(self, simulation, channels, samplesPerSec, bitsPerSample, outputDevice=None, wantDucking=True, **kwargs):
+        self.simulation = simulation
+        self.bytesPerSec = channels * samplesPerSec * bitsPerSample // 8
+        self.label = None
+        self.segments = []
+        self.busyUntil = 0.0
+        simulation.players.append(self)
+
+    def feed(self, data, *args, **kwargs):
+        now = self.simulation.clock.now
+        start = max(now, self.busyUntil)
+        end = start + len(data) / self.bytesPerSec
+        self.segments.append([self.label, start, end])
+        self.busyUntil = end
+
+    def idle(self):
+        clock = self.simulation.clock
+        if self.busyUntil > clock.now:
+            clock.sleep(self.busyUntil - clock.now)
+
+    def stop(self):
+        now = self.simulation.clock.now
+        for segment in self.segments:
+            if segment[2] > now:
+                segment[2] = max(segment[1], now)
+        self.busyUntil = min(self.busyUntil, now)
+
+    def pause(self, switch):
+        pass
+
+    def close(self):
+        pass
+
+
+class Simulation:
+    def __init__(self, plugin, numThreads=5):
+        self.plugin = plugin
+        self.clock = VirtualClock()
+        self.players = []
+        self.cancelTimes = []
+        self.scheduled = []
+        self.cancelsBefore = {}
+        self.chainOf = {}
+        self.chains = 0
+        plugin.clock = self.clock
+        plugin.earconThrottle = plugin.EarconThrottle()
+        self.lastUtteranceTime = 0.0
+        plugin.threadPool = SimulatedThreadPool(self.clock, numThreads)
+        plugin.nvwave.WavePlayer = functools.partial(RecordingWavePlayer, self)
+        beepPlayer = RecordingWavePlayer(self, channels=2, samplesPerSec=44100, bitsPerSample=16)
+        beepPlayer.label = "beep"
+        plugin.ppSynchronousPlayer = beepPlayer
+
+    def waveCommand(self, label, fileName, **kwargs):
+        command = self.plugin.PpWaveFileCommand(os.path.join(self.plugin.getSoundsPath(), fileName), **kwargs)
+        command.prepare()
+        command.fileWavePlayer.label = label
+        return command
+
+    def configure(self, **values):
+        self.plugin.config.conf[self.plugin.pp].update(values)
+        self.plugin.refreshSettings()
+
+    def speakChain(self, at, subcommands, labels):
+        """
+        Simulates the synth reaching the chain's callback at virtual time at (seconds).
+        The chain is created at the same time, so key repeat policies see the interval between calls.
+        """
+        self.clock.runUntil(at)
+        chain = self.plugin.PpChainCommand(subcommands, maxDuration=self.plugin.earconThrottle.getMaxDuration())
+        offset = self.clock.now
+        self.lastUtteranceTime = offset
+        for label, subcommand in zip(labels, subcommands):
+            self.schedule(label, subcommand, offset)
+            offset += chain.getSubcommandDuration(subcommand) / 1000
+        self.chains += 1
+        chain.run()
+        return chain
+
+    def speakEarcon(self, at, command, label):
+        """ Simulates the speech manager running a bare earcon command at virtual time at (seconds). """
+        self.clock.runUntil(at)
+        self.lastUtteranceTime = self.clock.now
+        self.schedule(label, command, self.clock.now)
+        self.chains += 1
+        cancelCount = len(self.cancelTimes)
+        def run():
+            # The speech manager doesn't run callbacks of cancelled utterances.
+            if len(self.cancelTimes) == cancelCount:
+                command.run()
+        self.plugin.threadPool.add_task(run)
+
+    def schedule(self, label, command, offset):
+        delay = max(0, -getattr(command, "startAdjustment", 0)) / 1000
+        self.scheduled.append((label, offset + delay))
+        self.cancelsBefore[label] = len(self.cancelTimes)
+        self.chainOf[label] = self.chains
+
+    def cancel(self, at):
+        self.clock.runUntil(at)
+        self.cancelTimes.append(self.clock.now)
+        self.plugin.preCancelSpeech()
+
+    def navigate(self, at):
+        self.cancel(at)
+
+    def finish(self):
+        self.clock.runUntil()
+        return self.report()
+
+    def report(self):
+        segments = sorted(
+            (Segment(*s) for player in self.players for s in player.segments if s[2] > s[1] or not self.cancelTimes),
+            key=lambda s: s.start,
+        )
+        firstStart = {}
+        for segment in segments:
+            firstStart.setdefault(segment.label, segment.start)
+        errors = [
+            firstStart[label] - scheduled
+            for label, scheduled in self.scheduled
+            if label in firstStart
+        ]
+        chainSegments = collections.defaultdict(list)
+        for segment in segments:
+            chainSegments[self.chainOf.get(segment.label)].append(segment)
+        gaps = [
+            max(0, b.start - a.end)
+            for chain in chainSegments.values()
+            for a, b in zip(chain, chain[1:])
+        ]
+        # Sweep line over segment boundaries to find time with more than one voice audible.
+        events = sorted([(s.start, 1) for s in segments] + [(s.end, -1) for s in segments])
+        overlap = 0.0
+        voices = 0
+        last = None
+        for t, delta in events:
+            if voices > 1:
+                overlap += t - last
+            voices += delta
+            last = t
+        # Audio of an utterance heard after the first cancellation following its start.
+        leakage = 0.0
+        for segment in segments:
+            cancelIndex = self.cancelsBefore.get(segment.label, 0)
+            if cancelIndex < len(self.cancelTimes):
+                leakage += max(0, segment.end - max(segment.start, self.cancelTimes[cancelIndex]))
+        backlog = max((segment.end for segment in segments), default=0) - self.lastUtteranceTime
+        ms = lambda x: round(1000 * x, 3)
+        return {
+            "earcons": len(segments),
+            "missing": sorted(label for label, scheduled in self.scheduled if label not in firstStart),
+            "startErrorMeanMs": ms(sum(errors) / len(errors)) if errors else None,
+            "startErrorMaxMs": ms(max(errors)) if errors else None,
+            "jitterMs": ms(max(errors) - min(errors)) if errors else None,
+            "gapMaxMs": ms(max(gaps)) if gaps else 0,
+            "overlapMs": ms(overlap),
+            "leakageMs": ms(leakage),
+            "backlogMs": ms(max(0, backlog)),
+            "maxQueuedTasks": self.plugin.threadPool.maxPending,
+            "errors": [repr(e) for e in self.plugin.threadPool.errors],
+        }
+
+
+def scenarioSingle(sim):
+    a = sim.waveCommand("a", os.path.join("chimes", "help.wav"))
+    sim.speakChain(0, [a], ["a"])
+
+def scenarioChain(sim):
+    commands = [sim.waveCommand(label, os.path.join("classic", name)) for label, name in [("a", "on.wav"), ("b", "off.wav"), ("c", "on.wav")]]
+    sim.speakChain(0, commands, ["a", "b", "c"])
+
+def scenarioNegativeStartAdjustment(sim):
+    a = sim.waveCommand("a", os.path.join("classic", "on.wav"))
+    b = sim.waveCommand("b", os.path.join("classic", "off.wav"), startAdjustment=-100)
+    sim.speakChain(0, [a, b], ["a", "b"])
+
+def scenarioCancelMidChain(sim):
+    commands = [sim.waveCommand(label, os.path.join("chimes", "help.wav")) for label in "abc"]
+    sim.speakChain(0, commands, list("abc"))
+    sim.cancel(1.5 * commands[0].getDuration() / 1000)
+
+def scenarioOverlappingUtterances(sim):
+    first = [sim.waveCommand(label, os.path.join("chimes", "help.wav")) for label in ["a1", "a2"]]
+    second = [sim.waveCommand(label, os.path.join("classic", "on.wav")) for label in ["b1", "b2"]]
+    sim.speakChain(0, first, ["a1", "a2"])
+    sim.speakChain(0.05, second, ["b1", "b2"])
+
+def scenarioKeyRepeat(sim):
+    # Holding down arrow: a new utterance every 30 ms, each cancelling the previous one.
+    for i in range(12):
+        at = 0.03 * i
+        sim.navigate(at)
+        command = sim.waveCommand(f"r{i}", os.path.join("unspoken", "button.wav"))
+        sim.speakChain(at, [command], [f"r{i}"])
+
+def scenarioBareKeyRepeat(sim):
+    # As keyRepeat, with role earcons spoken as bare commands rather than chains.
+    for i in range(12):
+        at = 0.03 * i
+        sim.navigate(at)
+        command = sim.waveCommand(f"r{i}", os.path.join("chimes", "help.wav"))
+        sim.speakEarcon(at, command, f"r{i}")
+
+def scenarioPoolSaturation(sim):
+    # More concurrent chains than pool workers.
+    for i in range(4):
+        commands = [sim.waveCommand(f"s{i}{j}", os.path.join("classic", "on.wav")) for j in range(3)]
+        sim.speakChain(0.01 * i, commands, [f"s{i}{j}" for j in range(3)])
+
+def scenarioRapidNavigation(sim):
+    # Pressing h every 60 ms: each press cancels speech and speaks a chain of two earcons.
+    for i in range(10):
+        sim.navigate(0.06 * i)
+        commands = [sim.waveCommand(f"h{i}{j}", os.path.join("chimes", name)) for j, name in enumerate(["help.wav", "item.wav"])]
+        sim.speakChain(0.06 * i, commands, [f"h{i}{j}" for j in range(2)])
+
+def scenarioRapidNavigationUnthrottled(sim):
+    sim.configure(supersedeEarcons=False, maxActiveChains=16, rapidInterval=0)
+    scenarioRapidNavigation(sim)
+
+scenarios = collections.OrderedDict([
+    ("single", scenarioSingle),
+    ("chain", scenarioChain),
+    ("negativeStartAdjustment", scenarioNegativeStartAdjustment),
+    ("cancelMidChain", scenarioCancelMidChain),
+    ("overlappingUtterances", scenarioOverlappingUtterances),
+    ("keyRepeat", scenarioKeyRepeat),
+    ("bareKeyRepeat", scenarioBareKeyRepeat),
+    ("poolSaturation", scenarioPoolSaturation),
+    ("rapidNavigation", scenarioRapidNavigation),
+    ("rapidNavigationUnthrottled", scenarioRapidNavigationUnthrottled),
+])
+
+
+def runScenario(plugin, scenario):
+    section = plugin.config.conf[plugin.pp]
+    savedConfig = dict(section)
+    sim = Simulation(plugin)
+    try:
+        scenario(sim)
+        return sim.finish()
+    finally:
+        section.clear()
+        section.update(savedConfig)
+        plugin.refreshSettings()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", default=None, help="Also write results to this JSON file.")
+    parser.add_argument("-k", dest="keyword", default=None, help="Only run scenarios containing this substring.")
+    args = parser.parse_args()
+    plugin = nvdaStubs.loadPlugin()
+    results = collections.OrderedDict()
+    for name, scenario in scenarios.items():
+        if args.keyword and args.keyword not in name:
+            continue
+        results[name] = runScenario(plugin, scenario)
+    columns = ["earcons", "startErrorMeanMs", "startErrorMaxMs", "jitterMs", "gapMaxMs", "overlapMs", "leakageMs", "backlogMs", "maxQueuedTasks"]
+    print(f"{'scenario':25}" + "".join(f"{c:>17}" for c in columns))
+    for name, result in results.items():
+        print(f"{name:25}" + "".join(f"{str(result[c]):>17}" for c in columns))
+        if result["missing"]:
+            print(f"    not played: {', '.join(result['missing'])}")
+        for error in result["errors"]:
+            print(f"    error: {error}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())